@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_login import login_required, current_user
-from models import db, User, Sales, Returns, Target, Product, ActivityLog, UserRole, Department, DepartmentPermission, Task, TaskComment, Notification, Planning, PlanningSnapshot
+from models import db, User, Sales, Returns, Target, Product, ActivityLog, UserRole, Department, DepartmentPermission, Task, TaskComment, Notification, Planning, PlanningSnapshot, Purchase, PurchaseMonthly, ExportJob, TaskOccurrence, TaskReminder, CalendarToken, UserDayActivity
 from auth import (
     admin_required,
     representative_required,
@@ -12,9 +12,24 @@ from auth import (
 )
 from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, case, insert, update, delete, select
+from sqlalchemy.orm import defer, aliased
+from sqlalchemy.dialects import postgresql, sqlite
+from task_occurrences import occurrence_query, resync_task_occurrences, ensure_occurrence_horizon
+from search import search_documents, snippet_html, reindex_plans, reindex_tasks, reindex_comments, reindex_user_documents
+from day_activity import refresh_day_activity, refresh_task_day_activity
+from snapshots import add_planning_snapshot, load_snapshot_versions
+from notifications import (
+    admin_ids, department_manager_id, event_recipients, notify, send_notifications,
+    unread_notification_count, mark_read, recount_unread,
+)
+from notification_stream import acquire_stream_slot, ensure_relay, mark_changed, release_stream_slot, subscribe, unsubscribe
 import io
+import json
+import queue
+import time
 import base64
+import hashlib
 from werkzeug.utils import secure_filename
 import os
 from werkzeug.security import generate_password_hash
@@ -80,9 +95,9 @@ def planning_today():
     """
     user_id = current_user.id
     today = today_tr()
-    plan = Planning.query.filter_by(representative_id=user_id, date=today).first()
     if request.method == 'GET':
-        snapshots = PlanningSnapshot.query.filter_by(representative_id=user_id, date=today).order_by(PlanningSnapshot.created_at.asc()).all()
+        plan = Planning.query.filter_by(representative_id=user_id, date=today).first()
+        snapshots = load_snapshot_versions([user_id], today).get((user_id, today), [])
         return jsonify({
             'success': True,
             'plan': ({
@@ -93,42 +108,45 @@ def planning_today():
                 'challenges': plan.challenges,
                 'created_at': plan.created_at.isoformat()
             } if plan else None),
-            'snapshots': [{
-                'id': s.id,
-                'yesterday_activities': s.yesterday_activities,
-                'today_plan': s.today_plan,
-                'challenges': s.challenges,
-                'created_at': s.created_at.isoformat(),
-            } for s in snapshots]
+            'snapshots': [day_snapshot_payload(s) for s in snapshots]
         })
     data = request.get_json() or {}
-    if not plan:
-        plan = Planning(
-            representative_id=user_id,
-            date=today,
-            yesterday_activities=data.get('yesterday_activities'),
-            today_plan=data.get('today_plan'),
-            challenges=data.get('challenges')
-        )
-        db.session.add(plan)
-    else:
-        if not plan.can_edit():
-            return jsonify({'success': False, 'error': '24 saat geçti, düzenleme yapılamaz'}), 400
-        plan.yesterday_activities = data.get('yesterday_activities')
-        plan.today_plan = data.get('today_plan')
-        plan.challenges = data.get('challenges')
-    # snapshot kaydet
-    snap = PlanningSnapshot(
-        representative_id=user_id,
-        date=today,
-        yesterday_activities=plan.yesterday_activities,
-        today_plan=plan.today_plan,
-        challenges=plan.challenges,
-    )
-    db.session.add(snap)
+    values = {name: data.get(name) for name in ('yesterday_activities', 'today_plan', 'challenges')}
+    saved = upsert_daily_plan(user_id, today, values)
+    if not saved:
+        return jsonify({'success': False, 'error': '24 saat geçti, düzenleme yapılamaz'}), 400
+    plan_id, inserted = saved
+    # snapshot kaydet: önceki sürüme göre fark olarak (değişiklik yoksa yazılmaz).
+    # Upsert satırı kilitlediği için aynı gün için eşzamanlı kayıtlar zinciri sırayla okur.
+    snap = add_planning_snapshot(user_id, today, values)
+    if inserted or snap is not None:
+        reindex_plans([plan_id])
+    if inserted and snap is None:
+        # Snapshot flush'ı gün etkinliğini zaten yeniler; yazılmadıysa plan günü elle işaretlenir
+        refresh_day_activity([user_id], today, today)
     db.session.commit()
     return jsonify({'success': True})
 
+def upsert_daily_plan(user_id, day, values):
+    """Günün planını tek ifadeyle ekle/güncelle: INSERT ... ON CONFLICT (representative_id, date) DO UPDATE.
+    Güncelleme yalnız kayıt 24 saatten yeniyse yapılır (Planning.can_edit ile aynı kural).
+    (plan id, yeni eklendi mi) döner; süre geçtiyse None.
+    """
+    now = datetime.utcnow()
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(Planning).values(
+        representative_id=user_id, date=day, created_at=now, updated_at=now, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Planning.representative_id, Planning.date],
+        set_={**{name: stmt.excluded[name] for name in values}, 'updated_at': stmt.excluded.updated_at},
+        where=Planning.created_at > now - timedelta(hours=24),
+    ).returning(Planning.id, Planning.created_at)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None
+    # created_at yalnız eklemede yazılır: dönen değer bizim zaman damgamızsa satır yeni eklenmiştir
+    return row.id, row.created_at == now
+
 @api.route('/tasks/<int:task_id>', methods=['DELETE'])
 @login_required
 def delete_task(task_id):
@@ -196,43 +214,82 @@ def delete_task(task_id):
         print(f"[ERROR] Görev silme hatası: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@api.route('/planning/months', methods=['GET'])
-@login_required
-def planning_months():
-    """Belirli bir yıl için 12 ayı klasör mantığında döner.
-    Admin/DM: user_id parametresi ile başka kullanıcıyı görüntüleyebilir.
-    Parametreler: year (int) – verilmezse TR güncel yıl kullanılır.
-    """
+def planning_target_user_id():
+    """Admin/DM user_id ile başka kullanıcıyı görüntüleyebilir; diğerleri (ve kapsam dışı istek) kendisi"""
     requested_user_id = request.args.get('user_id', type=int)
-    # Hedef kullanıcı
     if current_user.is_admin():
-        user_id = requested_user_id or current_user.id
-    elif current_user.is_department_manager():
-        user_id = requested_user_id if (requested_user_id and is_user_in_scope(requested_user_id)) else current_user.id
-    else:
-        user_id = current_user.id
-    # Hedef yıl
-    param_year = request.args.get('year', type=int)
-    base_date = today_tr()
-    year = param_year or base_date.year
+        return requested_user_id or current_user.id
+    if current_user.is_department_manager():
+        return requested_user_id if (requested_user_id and is_user_in_scope(requested_user_id)) else current_user.id
+    return current_user.id
+
+PLANNING_CALENDAR_YEARS = range(1900, 2101)
+# Tekrarlar en fazla bu kadar yıl ileriye açılır (uzak yıllar için tablo şişirilmez)
+PLANNING_CALENDAR_MAX_YEARS_AHEAD = 5
+
+def ensure_planning_calendar_horizon(year):
+    """Yıl takvimi için tekrarları açar (en fazla PLANNING_CALENDAR_MAX_YEARS_AHEAD yıl ileri); eklendiyse commit"""
+    until = min(date(year, 12, 31), date(today_tr().year + PLANNING_CALENDAR_MAX_YEARS_AHEAD, 12, 31))
+    if ensure_occurrence_horizon(until):
+        db.session.commit()
+
+def planning_year_calendar(user_id, year):
+    """Bir yılın ay ve gün işaretleri (strftime yok, her iki veritabanında çalışır).
+    Dönüş: 12 ay, her biri {year, month, label, days_with_entries, days_with_tasks, plan_days, task_days}
+    """
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    # Etkinlik indeksinden tek aralık okuması; snapshot'lar gün işaretine dahil (ay takvimiyle aynı), ay sayısına dahil değil
+    plan_days, marked_plan_days, task_days = set(), set(), set()
+    for day, has_plan, snapshot_count, occurrence_count in db.session.query(
+        UserDayActivity.date, UserDayActivity.has_plan, UserDayActivity.snapshot_count, UserDayActivity.occurrence_count
+    ).filter(UserDayActivity.user_id == user_id, UserDayActivity.date >= start, UserDayActivity.date < end).all():
+        if has_plan:
+            plan_days.add(day)
+        if has_plan or snapshot_count:
+            marked_plan_days.add(day)
+        if occurrence_count:
+            task_days.add(day)
+
     months = []
     for m in range(1, 13):
-        y = year
-        start = date(y, m, 1)
-        end_month = m + 1
-        end_year = y + (1 if end_month == 13 else 0)
-        end = date(end_year, 1 if end_month == 13 else end_month, 1)
-        days_with_entries = Planning.query.filter(
-            Planning.representative_id == user_id,
-            Planning.date >= start,
-            Planning.date < end
-        ).count()
         months.append({
-            'year': y,
+            'year': year,
             'month': m,
-            'label': f"{y}-{str(m).zfill(2)}",
-            'days_with_entries': days_with_entries
+            'label': f"{year}-{str(m).zfill(2)}",
+            'days_with_entries': sum(1 for d in plan_days if d.month == m),
+            'days_with_tasks': sum(1 for d in task_days if d.month == m),
+            'plan_days': sorted(d.day for d in marked_plan_days if d.month == m),
+            'task_days': sorted(d.day for d in task_days if d.month == m),
         })
+    return months
+
+@api.route('/planning/year-calendar', methods=['GET'])
+@login_required
+def planning_year_calendar_endpoint():
+    """Yıl takvimi: her ay için plan/görev gün sayıları ve gün bazlı işaretler.
+    Admin/DM: user_id parametresi ile başka kullanıcıyı görüntüleyebilir. Parametreler: year (varsayılan TR güncel yıl).
+    """
+    user_id = planning_target_user_id()
+    year = request.args.get('year', type=int) or today_tr().year
+    if year not in PLANNING_CALENDAR_YEARS:
+        return jsonify({'success': False, 'error': 'Geçersiz yıl'}), 400
+    ensure_planning_calendar_horizon(year)
+    return jsonify({'success': True, 'year': year, 'user_id': user_id, 'months': planning_year_calendar(user_id, year)})
+
+@api.route('/planning/months', methods=['GET'])
+@login_required
+def planning_months():
+    """Belirli bir yıl için 12 ayı klasör mantığında döner.
+    Admin/DM: user_id parametresi ile başka kullanıcıyı görüntüleyebilir.
+    Parametreler: year (int) – verilmezse TR güncel yıl kullanılır.
+    """
+    user_id = planning_target_user_id()
+    year = request.args.get('year', type=int) or today_tr().year
+    if year not in PLANNING_CALENDAR_YEARS:
+        return jsonify({'success': False, 'error': 'Geçersiz yıl'}), 400
+    ensure_planning_calendar_horizon(year)
+    months = [{k: month[k] for k in ('year', 'month', 'label', 'days_with_entries', 'days_with_tasks')}
+              for month in planning_year_calendar(user_id, year)]
     return jsonify({'success': True, 'year': year, 'months': months})
 
 @api.route('/planning/month', methods=['GET'])
@@ -258,77 +315,44 @@ def planning_month_detail():
     end_year = y + (1 if end_month == 13 else 0)
     end = date(end_year, 1 if end_month == 13 else end_month, 1)
 
-    # Plan var mı (ana plan veya snapshot)
-    plan_days = set()
-    plan_days.update(d[0] for d in db.session.query(Planning.date).filter(
-        Planning.representative_id == user_id,
-        Planning.date >= start,
-        Planning.date < end
-    ).all())
-    # Snapshot'lar da plan göstergesine dahil
-    plan_days.update(d[0] for d in db.session.query(PlanningSnapshot.date).filter(
-        PlanningSnapshot.representative_id == user_id,
-        PlanningSnapshot.date >= start,
-        PlanningSnapshot.date < end
-    ).all())
-    # Görev var mı: o ayın herhangi bir gününde occurrence var mı (recurrence dahil)
-    task_days = set()
-    task_start_days = set()
-    task_due_days = set()
-    
-    tasks = Task.query.filter(
-        (Task.assigned_to_id == user_id) | (Task.created_by_id == user_id)
-    ).all()
-    from calendar import monthrange
-    num_days = monthrange(y, m)[1]
-
-    # Ayrıntı haritası: sadece admin veya departman yöneticisi için küçük özet döneceğiz
+    # Gün işaretleri: etkinlik indeksinden tek aralık okuması
+    if ensure_occurrence_horizon(end - timedelta(days=1)):
+        db.session.commit()
+    plan_days, task_days, task_start_days, task_due_days = set(), set(), set(), set()
+    for a in UserDayActivity.query.filter(
+        UserDayActivity.user_id == user_id,
+        UserDayActivity.date >= start,
+        UserDayActivity.date < end
+    ).all():
+        if a.has_plan or a.snapshot_count:
+            plan_days.add(a.date)
+        if a.occurrence_count:
+            task_days.add(a.date)
+        if a.task_start_count:
+            task_start_days.add(a.date)
+        if a.task_due_count:
+            task_due_days.add(a.date)
+
+    # Ayrıntı haritası: sadece admin veya departman yöneticisi için küçük özet (gün başına ilk görevlerin kişileri)
     is_privileged = current_user.is_admin() or current_user.is_department_manager()
     day_tasks_map = {}
-    for dnum in range(1, num_days+1):
-        dte = date(y, m, dnum)
-        for t in tasks:
-            if task_occurs_on(t, dte):
-                task_days.add(dte)
-                if is_privileged:
-                    lst = day_tasks_map.setdefault(dte, [])
-                    # İsimleri hazırla
-                    try:
-                        to_name = (t.assigned_to.get_full_name() if getattr(t, 'assigned_to', None) else None)
-                    except Exception:
-                        to_name = None
-                    try:
-                        by_name = (t.assigned_by.get_full_name() if getattr(t, 'assigned_by', None) else None)
-                    except Exception:
-                        by_name = None
-                    # Geriye dönük: assigned_by yoksa created_by kullan
-                    if not by_name:
-                        try:
-                            by_name = (t.created_by.get_full_name() if getattr(t, 'created_by', None) else None)
-                        except Exception:
-                            by_name = None
-                    lst.append({
-                        'assigned_to_name': to_name or '-',
-                        'assigned_by_name': by_name or '-',
-                    })
-
-    # Atama ve bitiş işaretleri
-    for t in tasks:
-        try:
-            # Atama günü: start_date varsa onu, yoksa created_at tarihini kullan
-            if t.start_date and (t.start_date >= start and t.start_date < end):
-                task_start_days.add(t.start_date)
-            elif getattr(t, 'created_at', None):
-                ca = t.created_at.date() if isinstance(t.created_at, datetime) else None
-                if ca and (ca >= start and ca < end):
-                    task_start_days.add(ca)
-        except Exception:
-            pass
-        try:
-            if t.due_date and (t.due_date >= start and t.due_date < end):
-                task_due_days.add(t.due_date)
-        except Exception:
-            pass
+    if is_privileged and task_days:
+        occurrences = db.session.query(
+            TaskOccurrence.date, Task.assigned_to_id, Task.assigned_by_id, Task.created_by_id
+        ).join(Task, Task.id == TaskOccurrence.task_id).filter(
+            TaskOccurrence.user_id == user_id,
+            TaskOccurrence.date >= start,
+            TaskOccurrence.date < end
+        ).order_by(TaskOccurrence.date.asc(), Task.id.asc()).all()
+        # İsimler tek sorguda (görev başına lazy-load yerine)
+        name_ids = {uid for row in occurrences for uid in row[1:] if uid}
+        names = {u.id: u.get_full_name() for u in User.query.filter(User.id.in_(name_ids)).all()}
+        for dte, to_id, by_id, creator_id in occurrences:
+            # Geriye dönük: assigned_by yoksa created_by kullan
+            day_tasks_map.setdefault(dte, []).append({
+                'assigned_to_name': names.get(to_id) or '-',
+                'assigned_by_name': names.get(by_id) or names.get(creator_id) or '-',
+            })
     days = []
     from calendar import monthrange
     num_days = monthrange(y, m)[1]
@@ -354,43 +378,66 @@ def planning_month_detail():
 @login_required
 def planning_years():
     """Kullanıcı için yıl klasörleri. Admin/DM user_id ile başkasını görüntüleyebilir."""
-    requested_user_id = request.args.get('user_id', type=int)
-    if current_user.is_admin():
-        user_id = requested_user_id or current_user.id
-    elif current_user.is_department_manager():
-        user_id = requested_user_id if (requested_user_id and is_user_in_scope(requested_user_id)) else current_user.id
-    else:
-        user_id = current_user.id
-
-    # Planning yılları
-    planning_years_rows = db.session.query(func.strftime('%Y', Planning.date)).filter(
-        Planning.representative_id == user_id
-    ).distinct().all()
-    years_set = set(int(y[0]) for y in planning_years_rows if y and y[0])
-
-    # Task yılları (due_date)
-    task_years_rows = db.session.query(func.strftime('%Y', Task.due_date)).filter(
-        ((Task.assigned_to_id == user_id) | (Task.created_by_id == user_id)) & (Task.due_date.isnot(None))
-    ).distinct().all()
-    years_set.update(int(y[0]) for y in task_years_rows if y and y[0])
+    user_id = planning_target_user_id()
+
+    # Plan günü sayıları ve görev bitiş yılları etkinlik indeksinden tek gruplu sorguyla
+    year_col = func.extract('year', UserDayActivity.date)
+    days_by_year, years_set = {}, set()
+    for y, plan_count, due_count in db.session.query(
+        year_col,
+        func.sum(case((UserDayActivity.has_plan.is_(True), 1), else_=0)),
+        func.sum(UserDayActivity.task_due_count)
+    ).filter(UserDayActivity.user_id == user_id).group_by(year_col).all():
+        if y is None or not (plan_count or due_count):
+            continue
+        years_set.add(int(y))
+        days_by_year[int(y)] = int(plan_count or 0)
 
     # En azından içinde bulunduğumuz yılı ekle
     years_set.add(today_tr().year)
-    years = sorted(list(years_set), reverse=True)
-
-    result = []
-    for y in years:
-        start = date(y, 1, 1)
-        end = date(y + 1, 1, 1)
-        days_with_entries = Planning.query.filter(
-            Planning.representative_id == user_id,
-            Planning.date >= start,
-            Planning.date < end
-        ).count()
-        result.append({'year': y, 'label': f"{y}", 'days_with_entries': days_with_entries})
+    years = sorted(years_set, reverse=True)
 
+    result = [{'year': y, 'label': f"{y}", 'days_with_entries': days_by_year.get(y, 0)} for y in years]
     return jsonify({'success': True, 'years': result})
 
+TASK_PRIORITY_ORDER = {'high': 0, 'normal': 1, 'low': 2}
+
+def day_task_sort_key(t: Task):
+    return (TASK_PRIORITY_ORDER.get((t.priority or 'normal').lower(), 1), (t.due_date or date.max))
+
+def day_plan_payload(plan):
+    if not plan:
+        return None
+    return {
+        'id': plan.id,
+        'yesterday_activities': plan.yesterday_activities,
+        'today_plan': plan.today_plan,
+        'challenges': plan.challenges,
+        'created_at': plan.created_at.isoformat()
+    }
+
+def day_snapshot_payload(s):
+    """s: snapshots.snapshot_versions ile yeniden kurulmuş tam sürüm"""
+    return {
+        'id': s['id'],
+        'yesterday_activities': s['yesterday_activities'],
+        'today_plan': s['today_plan'],
+        'challenges': s['challenges'],
+        'created_at': s['created_at'].isoformat(),
+    }
+
+def day_task_payload(t: Task):
+    return {
+        'id': t.id,
+        'title': t.title,
+        'status': t.status,
+        'priority': t.priority,
+        'due_date': t.due_date.isoformat() if t.due_date else None,
+        'created_at': t.created_at.isoformat() if t.created_at else None,
+        'start_date': t.start_date.isoformat() if t.start_date else None,
+        'description': t.description
+    }
+
 @api.route('/planning/day', methods=['GET', 'DELETE'])
 @login_required
 def planning_day_detail():
@@ -437,52 +484,103 @@ def planning_day_detail():
         return jsonify({'success': True, 'deleted': deleted})
 
     plan = Planning.query.filter_by(representative_id=user_id, date=target_date).first()
-    snapshots = PlanningSnapshot.query.filter_by(representative_id=user_id, date=target_date).order_by(PlanningSnapshot.created_at.asc()).all()
-    tasks = Task.query.filter(
-        (Task.assigned_to_id == user_id) | (Task.created_by_id == user_id)
-    ).all()
-    # Recurrence-aware filter
-    tasks = [t for t in tasks if task_occurs_on(t, target_date)]
+    snapshots = load_snapshot_versions([user_id], target_date).get((user_id, target_date), [])
+    # Tekrarlar dahil o güne düşen görevler: task_occurrence (user_id, date) indeksinden
+    if ensure_occurrence_horizon(target_date):
+        db.session.commit()
+    tasks = [t for _, t in occurrence_query([user_id], target_date, target_date).all()]
     # Sort by priority (high > normal > low), then due_date
-    priority_order = {'high': 0, 'normal': 1, 'low': 2}
-    tasks.sort(key=lambda t: (priority_order.get((t.priority or 'normal').lower(), 1), (t.due_date or date.max)))
+    tasks.sort(key=day_task_sort_key)
 
     return jsonify({
         'success': True,
         'date': target_date.isoformat(),
-        'plan': ({
-            'id': plan.id,
-            'yesterday_activities': plan.yesterday_activities,
-            'today_plan': plan.today_plan,
-            'challenges': plan.challenges,
-            'created_at': plan.created_at.isoformat()
-        } if plan else None),
-        'snapshots': [{
-            'id': s.id,
-            'yesterday_activities': s.yesterday_activities,
-            'today_plan': s.today_plan,
-            'challenges': s.challenges,
-            'created_at': s.created_at.isoformat(),
-        } for s in snapshots],
-        'tasks': [{
-            'id': t.id,
-            'title': t.title,
-            'status': t.status,
-            'priority': t.priority,
-            'due_date': t.due_date.isoformat() if t.due_date else None,
-            'created_at': t.created_at.isoformat() if t.created_at else None,
-            'start_date': t.start_date.isoformat() if t.start_date else None,
-            'description': t.description
-        } for t in tasks]
+        'plan': day_plan_payload(plan),
+        'snapshots': [day_snapshot_payload(s) for s in snapshots],
+        'tasks': [day_task_payload(t) for t in tasks]
     })
 
+@api.route('/planning/team-day', methods=['GET'])
+@login_required
+@admin_or_department_manager_required
+def planning_team_day():
+    """Bir gün için ekibin tüm plan, snapshot ve görevleri tek istekte (kullanıcı sayısından bağımsız sabit sorgu).
+    Parametreler: date (YYYY-MM-DD, varsayılan bugün), department_id (Admin: opsiyonel, yoksa tüm aktif kullanıcılar;
+    DM: yalnızca kendi departmanı).
+    """
+    date_str = request.args.get('date')
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else today_tr()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih formatı'}), 400
+    department_id = request.args.get('department_id', type=int)
+    if not current_user.is_admin():
+        if department_id and department_id != current_user.department_id:
+            return jsonify({'success': False, 'error': 'Bu departmana erişim yetkiniz yok'}), 403
+        department_id = current_user.department_id
+        if not department_id:
+            # Departmanı olmayan DM'in kapsamı boştur (get_scoped_user_ids ile aynı)
+            return jsonify({'success': True, 'date': target_date.isoformat(), 'users': []})
+
+    users_q = User.query.filter(User.is_active == True)
+    if department_id:
+        users_q = users_q.filter(User.department_id == department_id)
+    users = users_q.order_by(User.first_name.asc(), User.last_name.asc()).all()
+    user_ids = [u.id for u in users]
+    if not user_ids:
+        return jsonify({'success': True, 'date': target_date.isoformat(), 'users': []})
+
+    plans = {p.representative_id: p for p in Planning.query.filter(
+        Planning.representative_id.in_(user_ids),
+        Planning.date == target_date
+    ).all()}
+    snapshots = {rep_id: versions for (rep_id, _), versions in load_snapshot_versions(user_ids, target_date).items()}
+    if ensure_occurrence_horizon(target_date):
+        db.session.commit()
+    tasks_by_user = {}
+    for occ_user_id, t in db.session.query(TaskOccurrence.user_id, Task).join(Task, Task.id == TaskOccurrence.task_id).filter(
+        TaskOccurrence.user_id.in_(user_ids),
+        TaskOccurrence.date == target_date
+    ).all():
+        tasks_by_user.setdefault(occ_user_id, []).append(t)
+
+    # İsimler: ekip zaten yüklü; ekip dışındaki atayan/atanan kişiler tek sorguda
+    names = {u.id: u.get_full_name() for u in users}
+    missing = {uid for lst in tasks_by_user.values() for t in lst
+               for uid in (t.assigned_to_id, t.assigned_by_id, t.created_by_id) if uid and uid not in names}
+    if missing:
+        names.update({u.id: u.get_full_name() for u in User.query.filter(User.id.in_(missing)).all()})
+
+    result = []
+    for u in users:
+        user_tasks = sorted(tasks_by_user.get(u.id, []), key=day_task_sort_key)
+        result.append({
+            'user_id': u.id,
+            'name': names[u.id],
+            'department_role': u.department_role,
+            'plan': day_plan_payload(plans.get(u.id)),
+            'snapshots': [day_snapshot_payload(s) for s in snapshots.get(u.id, [])],
+            'tasks': [dict(day_task_payload(t),
+                           assigned_to_name=names.get(t.assigned_to_id),
+                           assigned_by_name=names.get(t.assigned_by_id) or names.get(t.created_by_id))
+                      for t in user_tasks]
+        })
+    return jsonify({'success': True, 'date': target_date.isoformat(), 'department_id': department_id, 'users': result})
+
 @api.route('/planning/archive/departments', methods=['GET'])
 @login_required
 def planning_archive_departments():
-    """Departman -> kullanıcılar ve kullanıcı bazlı görev istatistikleri."""
+    """Departman -> kullanıcılar ve kullanıcı bazlı görev istatistikleri.
+    Opsiyonel start/end (YYYY-MM-DD): yalnızca son tarihi (yoksa oluşturulma günü) aralıkta kalan görevler sayılır.
+    """
     scoped_ids = get_scoped_user_ids()
     # Opsiyonel departman filtresi
     requested_dept_id = request.args.get('department_id', type=int)
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih formatı. YYYY-MM-DD kullanın'}), 400
     # Departmanlar
     departments_q = Department.query
     if scoped_ids is not None and not current_user.is_admin():
@@ -493,25 +591,41 @@ def planning_archive_departments():
     departments = departments_q.all()
     today = today_tr()
 
+    # Kullanıcılar tüm departmanlar için tek sorguda
+    users_q = User.query.filter(User.department_id.in_([d.id for d in departments]))
+    if scoped_ids is not None:
+        users_q = users_q.filter(User.id.in_(scoped_ids))
+    users_by_dept = {}
+    for u in users_q.order_by(User.id.asc()).all():
+        users_by_dept.setdefault(u.department_id, []).append(u)
+
+    # İstatistikler: kapsamdaki tüm kullanıcılar için tek koşullu toplama (GROUP BY assigned_to_id)
+    user_ids = [u.id for users in users_by_dept.values() for u in users]
+    stats = {}
+    if user_ids:
+        overdue_task = and_(Task.due_date.isnot(None), Task.due_date < today,
+                         Task.status != 'completed', Task.status != 'cancelled')
+        stats_q = db.session.query(
+            Task.assigned_to_id,
+            func.count(Task.id),
+            func.sum(case((Task.status == 'completed', 1), else_=0)),
+            func.sum(case((Task.status == 'in_progress', 1), else_=0)),
+            func.sum(case((Task.status.in_(['pending', 'requested']), 1), else_=0)),
+            func.sum(case((overdue_task, 1), else_=0))
+        ).filter(Task.assigned_to_id.in_(user_ids))
+        if start:
+            stats_q = stats_q.filter(or_(Task.due_date >= start,
+                                         and_(Task.due_date.is_(None), Task.created_at >= datetime.combine(start, datetime.min.time()))))
+        if end:
+            stats_q = stats_q.filter(or_(Task.due_date <= end,
+                                         and_(Task.due_date.is_(None), Task.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))))
+        stats = {row[0]: row[1:] for row in stats_q.group_by(Task.assigned_to_id).all()}
+
     result = []
     for dept in departments:
-        users_q = User.query.filter(User.department_id == dept.id)
-        if scoped_ids is not None:
-            users_q = users_q.filter(User.id.in_(scoped_ids))
-        dept_users = users_q.all()
         users_payload = []
-        for u in dept_users:
-            total_tasks = Task.query.filter_by(assigned_to_id=u.id).count()
-            completed_tasks = Task.query.filter_by(assigned_to_id=u.id, status='completed').count()
-            in_progress = Task.query.filter_by(assigned_to_id=u.id, status='in_progress').count()
-            pending = Task.query.filter(Task.assigned_to_id==u.id, Task.status.in_(['pending','requested'])).count()
-            overdue = Task.query.filter(
-                Task.assigned_to_id==u.id,
-                Task.due_date.isnot(None),
-                Task.due_date < today,
-                Task.status != 'completed',
-                Task.status != 'cancelled'
-            ).count()
+        for u in users_by_dept.get(dept.id, []):
+            total_tasks, completed_tasks, in_progress, pending, overdue = (int(v or 0) for v in stats.get(u.id, (0, 0, 0, 0, 0)))
             completion_rate = (completed_tasks/total_tasks*100) if total_tasks>0 else 0
             users_payload.append({
                 'id': u.id,
@@ -533,143 +647,89 @@ def planning_archive_departments():
         })
     return jsonify({'success': True, 'departments': result})
 
-@api.route('/planning/export-excel', methods=['GET'])
-@login_required
-def export_planning_excel():
-    """Planlama ve görev verilerini Excel olarak export et"""
-    try:
-        year = request.args.get('year', type=int)
-        user_id = request.args.get('user_id', type=int)
-        
+def resolve_export_request(report_type, args):
+    """Dışa aktarım isteğinin kapsamını ve normalize parametrelerini çöz.
+    Dönüş: (scope, params, download_name). scope: kullanıcı id listesi veya None (admin: tümü).
+    Hatalı parametrede ValueError, yetkisiz erişimde PermissionError fırlatır.
+    """
+    if report_type == 'planning':
+        year = args.get('year', type=int)
+        user_id = args.get('user_id', type=int)
+        department_id = args.get('department_id', type=int)
         if not year:
-            return jsonify({'success': False, 'error': 'Yıl parametresi gerekli'}), 400
-        
+            raise ValueError('Yıl parametresi gerekli')
+        if department_id:
+            # Departman modu: tüm ekip tek dosyada
+            if not (current_user.is_admin() or current_user.is_department_manager_of(department_id)):
+                raise PermissionError('Bu departmana erişim yetkiniz yok')
+            scope = sorted(u.id for u in User.query.filter_by(department_id=department_id).with_entities(User.id).all())
+            return scope, {'year': year, 'department_id': department_id}, f'planlama_arsivi_departman_{department_id}_{year}.xlsx'
         # Kullanıcı yetkisi kontrol et
         if user_id and not current_user.is_admin() and not current_user.is_department_manager():
-            return jsonify({'success': False, 'error': 'Yetkiniz yok'}), 403
-        
+            raise PermissionError('Yetkiniz yok')
         if user_id and current_user.is_department_manager():
             # DM sadece kendi departmanındaki kullanıcıları görebilir
             if not is_user_in_scope(user_id):
-                return jsonify({'success': False, 'error': 'Bu kullanıcıya erişim yetkiniz yok'}), 403
-        
-        # Verileri topla
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        
-        wb = Workbook()
-        
-        # Planlama sayfası
-        ws_planning = wb.active
-        ws_planning.title = "Planlama"
-        
-        # Başlık stilleri
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="2D6CDF", end_color="2D6CDF", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Başlıkları ekle
-        headers = ["Tarih", "Kullanıcı", "Dün Yapılanlar", "Bugün Planı", "Zorluklar", "Oluşturulma Tarihi"]
-        for col, header in enumerate(headers, 1):
-            cell = ws_planning.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Planlama verilerini ekle
-        planning_query = Planning.query
-        if user_id:
-            planning_query = planning_query.filter_by(representative_id=user_id)
-        else:
-            # Kullanıcı kendi verilerini export ediyor
-            planning_query = planning_query.filter_by(representative_id=current_user.id)
-        
-        planning_query = planning_query.filter(
-            Planning.date >= date(year, 1, 1),
-            Planning.date <= date(year, 12, 31)
-        ).order_by(Planning.date.desc())
-        
-        planning_data = planning_query.all()
-        
-        row = 2
-        for plan in planning_data:
-            user = User.query.get(plan.representative_id)
-            ws_planning.cell(row=row, column=1, value=plan.date.strftime('%d.%m.%Y'))
-            ws_planning.cell(row=row, column=2, value=user.get_full_name() if user else 'Bilinmeyen')
-            ws_planning.cell(row=row, column=3, value=plan.yesterday_activities or '')
-            ws_planning.cell(row=row, column=4, value=plan.today_plan or '')
-            ws_planning.cell(row=row, column=5, value=plan.challenges or '')
-            ws_planning.cell(row=row, column=6, value=plan.created_at.strftime('%d.%m.%Y %H:%M'))
-            row += 1
-        
-        # Sütun genişliklerini ayarla
-        for col in range(1, len(headers) + 1):
-            ws_planning.column_dimensions[chr(64 + col)].width = 20
-        
-        # Görevler sayfası
-        ws_tasks = wb.create_sheet("Görevler")
-        
-        # Görev başlıkları
-        task_headers = ["Başlık", "Açıklama", "Atanan", "Oluşturan", "Durum", "Öncelik", "Bitiş Tarihi", "Oluşturulma Tarihi"]
-        for col, header in enumerate(task_headers, 1):
-            cell = ws_tasks.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-        
-        # Görev verilerini ekle
-        tasks_query = Task.query
-        if user_id:
-            tasks_query = tasks_query.filter(
-                (Task.assigned_to_id == user_id) | (Task.created_by_id == user_id)
-            )
+                raise PermissionError('Bu kullanıcıya erişim yetkiniz yok')
+        # user_id yoksa kullanıcı kendi verilerini export ediyor
+        return [user_id or current_user.id], {'year': year, 'user_id': user_id or current_user.id}, f'planlama_arsivi_{year}.xlsx'
+
+    if report_type in ('sales', 'returns'):
+        export_format = (args.get('format') or 'csv').lower()
+        if export_format not in ('csv', 'xlsx'):
+            raise ValueError('format csv veya xlsx olmalı')
+        try:
+            start_date = datetime.strptime(args['start_date'], '%Y-%m-%d').date() if args.get('start_date') else None
+            end_date = datetime.strptime(args['end_date'], '%Y-%m-%d').date() if args.get('end_date') else None
+        except ValueError:
+            raise ValueError('Geçersiz tarih formatı. YYYY-MM-DD kullanın')
+        representative_id = args.get('representative_id', type=int)
+        # Erişim kapsamı (GET /sales ile aynı)
+        if representative_id:
+            if not is_user_in_scope(representative_id):
+                raise PermissionError('Bu kullanıcıya erişim yetkiniz yok')
+            scope = [representative_id]
         else:
-            # Kullanıcı kendi görevlerini export ediyor
-            tasks_query = tasks_query.filter(
-                (Task.assigned_to_id == current_user.id) | (Task.created_by_id == current_user.id)
-            )
-        
-        # Yıl içindeki görevleri filtrele
-        tasks_data = []
-        for task in tasks_query.all():
-            # Görevin o yıl içinde aktif olduğunu kontrol et
-            if task.due_date and task.due_date.year == year:
-                tasks_data.append(task)
-            elif task.created_at and task.created_at.year == year:
-                tasks_data.append(task)
-        
-        row = 2
-        for task in tasks_data:
-            assigned_user = User.query.get(task.assigned_to_id) if task.assigned_to_id else None
-            created_user = User.query.get(task.created_by_id) if task.created_by_id else None
-            
-            ws_tasks.cell(row=row, column=1, value=task.title or '')
-            ws_tasks.cell(row=row, column=2, value=task.description or '')
-            ws_tasks.cell(row=row, column=3, value=assigned_user.get_full_name() if assigned_user else 'Atanmamış')
-            ws_tasks.cell(row=row, column=4, value=created_user.get_full_name() if created_user else 'Bilinmeyen')
-            ws_tasks.cell(row=row, column=5, value=task.status or '')
-            ws_tasks.cell(row=row, column=6, value=task.priority or '')
-            ws_tasks.cell(row=row, column=7, value=task.due_date.strftime('%d.%m.%Y') if task.due_date else '')
-            ws_tasks.cell(row=row, column=8, value=task.created_at.strftime('%d.%m.%Y %H:%M'))
-            row += 1
-        
-        # Sütun genişliklerini ayarla
-        for col in range(1, len(task_headers) + 1):
-            ws_tasks.column_dimensions[chr(64 + col)].width = 20
-        
-        # Excel dosyasını memory'de oluştur
-        from io import BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
+            scope = get_scoped_user_ids()
+            scope = sorted(scope) if scope is not None else None
+        params = {
+            'format': export_format,
+            'start_date': start_date.isoformat() if start_date else None,
+            'end_date': end_date.isoformat() if end_date else None,
+        }
+        prefix = 'satislar' if report_type == 'sales' else 'iadeler'
+        period = f"{params['start_date'] or 'baslangic'}_{params['end_date'] or 'bugun'}"
+        return scope, params, f"{prefix}_{period}.{export_format}"
+
+    raise ValueError('Geçersiz rapor tipi')
+
+@api.route('/planning/export-excel', methods=['GET'])
+@login_required
+def export_planning_excel():
+    """Planlama ve görev verilerini Excel olarak export et.
+    Parametreler: year (zorunlu), user_id (Admin/DM) veya department_id (Admin: herhangi, DM: kendi departmanı).
+    Dosya write_only çalışma kitabına satır satır yazılır ve geçici dosyadan akıtılır.
+    """
+    try:
+        from exports import new_write_only_workbook, write_planning_workbook, save_to_spool, XLSX_MIMETYPE
+
+        try:
+            user_ids, params, download_name = resolve_export_request('planning', request.args)
+        except ValueError as ve:
+            return jsonify({'success': False, 'error': str(ve)}), 400
+        except PermissionError as pe:
+            return jsonify({'success': False, 'error': str(pe)}), 403
+
+        wb = write_planning_workbook(new_write_only_workbook(), user_ids, params['year'])
+        output = save_to_spool(wb)
+
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
-            download_name=f'planlama_arsivi_{year}.xlsx'
+            download_name=download_name
         )
-        
+
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -686,6 +746,70 @@ def list_simple_departments():
             depts = []
     return jsonify({'success': True, 'departments': [{'id': d.id, 'name': d.name} for d in depts]})
 
+def scoped_task_query():
+    """Kullanıcının görebileceği görevler.
+    - Admin: tüm görevler
+    - DM: departman görevleri + kendi oluşturdukları/atandıkları
+    - Kullanıcı: kendisiyle ilgili görevler
+    """
+    query = Task.query
+    if current_user.is_admin():
+        return query
+    if current_user.is_department_manager():
+        return query.filter(
+            (Task.department_id == current_user.department_id) |
+            (Task.assigned_to_id == current_user.id) |
+            (Task.created_by_id == current_user.id)
+        )
+    return query.filter(
+        (Task.assigned_to_id == current_user.id) |
+        (Task.created_by_id == current_user.id)
+    )
+
+def iso_or_none(value):
+    return value.isoformat() if value else None
+
+# /api/tasks alanları (fields= ile seçilebilir)
+TASK_LIST_FIELDS = {
+    'id': lambda t: t.id,
+    'title': lambda t: t.title,
+    'description': lambda t: t.description,
+    'department_id': lambda t: t.department_id,
+    'assigned_by_id': lambda t: t.assigned_by_id,
+    'assigned_to_id': lambda t: t.assigned_to_id,
+    'created_by_id': lambda t: t.created_by_id,
+    'status': lambda t: t.status,
+    'priority': lambda t: t.priority,
+    'due_date': lambda t: iso_or_none(t.due_date),
+    'start_date': lambda t: iso_or_none(t.start_date),
+    'is_recurring': lambda t: t.is_recurring,
+    'recurrence': lambda t: t.recurrence,
+    'comment_count': lambda t: t.comment_count,
+    'created_at': lambda t: t.created_at.isoformat(),
+    'updated_at': lambda t: t.updated_at.isoformat(),
+}
+TASK_LIST_MAX_LIMIT = 500
+
+def task_list_cursor(t: Task) -> str:
+    """Sıralama anahtarı (due_date boş mu, due_date, created_at, id) -> opak cursor"""
+    payload = [iso_or_none(t.due_date), t.created_at.isoformat(), t.id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def task_list_after_cursor(cursor: str):
+    """Sıralama: due_date dolu olanlar önce (artan), sonra boşlar; eşitlikte created_at azalan, id azalan"""
+    due, created, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    created = datetime.fromisoformat(created)
+    task_id = int(task_id)
+    tie = or_(Task.created_at < created, and_(Task.created_at == created, Task.id < task_id))
+    if due is None:
+        return and_(Task.due_date.is_(None), tie)
+    due = date.fromisoformat(due)
+    return or_(
+        Task.due_date.is_(None),
+        Task.due_date > due,
+        and_(Task.due_date == due, tie)
+    )
+
 # Görev Yönetimi API
 @api.route('/tasks', methods=['GET'])
 @login_required
@@ -695,6 +819,8 @@ def list_tasks():
     - DM: kendi departmanı (department_id eşleşen) ve kendisinin oluşturduğu/görevlendirildiği görevler
     - Kullanıcı: kendisine atanan, kendisinin yarattığı ve departmanına ait (görme izni varsa) görevler
     Filtreler: status, assigned_to_id, start_date, end_date (due_date için)
+    Sayfalama: limit (en fazla 500) + cursor (yanıttaki next_cursor); fields=id,title,... alan seçimi.
+    Yanıt ETag taşır; liste değişmediyse If-None-Match ile 304 döner.
     """
     # Çoklu durum filtresi destekle: status birden fazla olabilir veya virgül-separe
     raw_status_list = request.args.getlist('status') or []
@@ -707,23 +833,7 @@ def list_tasks():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    query = Task.query
-
-    if current_user.is_admin():
-        pass
-    elif current_user.is_department_manager():
-        # DM: departman görevleri + kendi oluşturdukları/atandıkları
-        query = query.filter(
-            (Task.department_id == current_user.department_id) |
-            (Task.assigned_to_id == current_user.id) |
-            (Task.created_by_id == current_user.id)
-        )
-    else:
-        # Kullanıcı: kendisiyle ilgili görevler
-        query = query.filter(
-            (Task.assigned_to_id == current_user.id) |
-            (Task.created_by_id == current_user.id)
-        )
+    query = scoped_task_query()
 
     if statuses:
         query = query.filter(Task.status.in_(statuses))
@@ -741,29 +851,138 @@ def list_tasks():
         ed = datetime.strptime(end_date, '%Y-%m-%d').date()
         query = query.filter(or_(Task.due_date == None, Task.due_date <= ed))
 
-    tasks = query.order_by(Task.due_date.is_(None), Task.due_date.asc(), Task.created_at.desc()).all()
-    return jsonify({
+    # Alan seçimi: fields=id,title,status... (liste görünümleri açıklamayı çekmez)
+    fields = [f for f in (request.args.get('fields') or '').split(',') if f]
+    if any(f not in TASK_LIST_FIELDS for f in fields):
+        return jsonify({'success': False, 'error': 'Geçersiz alan'}), 400
+    fields = ['id'] + [f for f in fields if f != 'id'] if fields else list(TASK_LIST_FIELDS)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+
+    # ETag: filtrelenmiş kümenin sayısı + son güncelleme + yorum toplamı; değişmediyse gövde hiç üretilmez
+    count, last_update, max_id, comments = query.with_entities(
+        func.count(Task.id), func.max(Task.updated_at), func.max(Task.id), func.sum(Task.comment_count)
+    ).one()
+    etag = hashlib.sha1(f"{current_user.id}|{request.query_string.decode()}|{count}|{last_update}|{max_id}|{comments}".encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    if 'description' not in fields:
+        query = query.options(defer(Task.description))
+    if cursor:
+        try:
+            query = query.filter(task_list_after_cursor(cursor))
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'success': False, 'error': 'Geçersiz cursor'}), 400
+    query = query.order_by(Task.due_date.is_(None), Task.due_date.asc(), Task.created_at.desc(), Task.id.desc())
+
+    next_cursor = None
+    if limit:
+        limit = max(1, min(limit, TASK_LIST_MAX_LIMIT))
+        tasks = query.limit(limit + 1).all()
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = task_list_cursor(tasks[-1])
+    else:
+        tasks = query.all()
+
+    response = jsonify({
         'success': True,
-        'tasks': [
-            {
-                'id': t.id,
-                'title': t.title,
-                'description': t.description,
-                'department_id': t.department_id,
-                'assigned_by_id': t.assigned_by_id,
-                'assigned_to_id': t.assigned_to_id,
-                'created_by_id': t.created_by_id,
-                'status': t.status,
-                'priority': t.priority,
-                'due_date': t.due_date.isoformat() if t.due_date else None,
-                'start_date': t.start_date.isoformat() if t.start_date else None,
-                'is_recurring': t.is_recurring,
-                'recurrence': t.recurrence,
-                'created_at': t.created_at.isoformat(),
-                'updated_at': t.updated_at.isoformat(),
-            } for t in tasks
-        ]
+        'total': count,
+        'next_cursor': next_cursor,
+        'tasks': [{f: TASK_LIST_FIELDS[f](t) for f in fields} for t in tasks]
     })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Kanban panosu: sütun sırası ve sütun içi sıralama (öncelik, son tarih (boşlar sonda), id)
+TASK_BOARD_STATUSES = ('requested', 'pending', 'in_progress', 'completed', 'cancelled')
+TASK_BOARD_DEFAULT_PER_COLUMN = 20
+TASK_BOARD_MAX_PER_COLUMN = 100
+
+def task_priority_rank():
+    return case((Task.priority == 'high', TASK_PRIORITY_ORDER['high']),
+                (Task.priority == 'low', TASK_PRIORITY_ORDER['low']), else_=TASK_PRIORITY_ORDER['normal'])
+
+def task_board_order():
+    return (task_priority_rank(), Task.due_date.is_(None), Task.due_date, Task.id)
+
+def task_board_cursor(rank, t: Task) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, iso_or_none(t.due_date), t.id]).encode()).decode()
+
+def task_board_after_cursor(cursor: str):
+    rank, due, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    rank, task_id = int(rank), int(task_id)
+    if due is None:
+        same_rank = and_(Task.due_date.is_(None), Task.id > task_id)
+    else:
+        due = date.fromisoformat(due)
+        same_rank = or_(Task.due_date.is_(None), Task.due_date > due, and_(Task.due_date == due, Task.id > task_id))
+    return or_(task_priority_rank() > rank, and_(task_priority_rank() == rank, same_rank))
+
+@api.route('/tasks/board', methods=['GET'])
+@login_required
+def task_board():
+    """Durum sütunları: her sütun için toplam sayı + ilk N görev (tek ROW_NUMBER() OVER (PARTITION BY status) sorgusu).
+    Parametreler: per_column (varsayılan 20, en fazla 100), assigned_to_id, fields (bkz. /api/tasks).
+    "Daha fazla" için: status=<sütun>&cursor=<sütunun next_cursor'ı> – yalnızca o sütun döner.
+    """
+    per_column = max(1, min(request.args.get('per_column', TASK_BOARD_DEFAULT_PER_COLUMN, type=int), TASK_BOARD_MAX_PER_COLUMN))
+    status = request.args.get('status')
+    cursor = request.args.get('cursor')
+    if cursor and not status:
+        return jsonify({'success': False, 'error': 'cursor için status gerekli'}), 400
+    fields = [f for f in (request.args.get('fields') or '').split(',') if f]
+    if any(f not in TASK_LIST_FIELDS for f in fields):
+        return jsonify({'success': False, 'error': 'Geçersiz alan'}), 400
+    fields = ['id'] + [f for f in fields if f != 'id'] if fields else list(TASK_LIST_FIELDS)
+
+    query = scoped_task_query()
+    assigned_to_id = request.args.get('assigned_to_id', type=int)
+    if assigned_to_id:
+        query = query.filter(Task.assigned_to_id == assigned_to_id)
+    if status:
+        query = query.filter(Task.status == status)
+    totals = None
+    if cursor:
+        # Sütun toplamı imleçten bağımsızdır
+        totals = {status: query.count()}
+        try:
+            query = query.filter(task_board_after_cursor(cursor))
+        except (ValueError, TypeError, IndexError):
+            return jsonify({'success': False, 'error': 'Geçersiz cursor'}), 400
+
+    rank = task_priority_rank().label('rank')
+    row_number = func.row_number().over(partition_by=Task.status, order_by=task_board_order()).label('rn')
+    column_count = func.count(Task.id).over(partition_by=Task.status).label('column_count')
+    ranked = query.with_entities(Task.id.label('task_id'), Task.status.label('status'), rank, row_number, column_count).subquery()
+    board_q = db.session.query(Task, ranked.c.rank, ranked.c.column_count).join(ranked, ranked.c.task_id == Task.id).filter(
+        ranked.c.rn <= per_column + 1
+    ).order_by(ranked.c.status, ranked.c.rn)
+    if 'description' not in fields:
+        board_q = board_q.options(defer(Task.description))
+
+    columns = {}
+    for t, t_rank, count in board_q.all():
+        column = columns.setdefault(t.status, {'status': t.status, 'count': (totals or {}).get(t.status, count),
+                                               'tasks': [], 'next_cursor': None, '_last': None})
+        if len(column['tasks']) < per_column:
+            column['tasks'].append({f: TASK_LIST_FIELDS[f](t) for f in fields})
+            column['_last'] = (t_rank, t)
+        else:
+            column['next_cursor'] = task_board_cursor(*column['_last'])
+
+    order = [status] if status else list(TASK_BOARD_STATUSES) + sorted(set(columns) - set(TASK_BOARD_STATUSES))
+    result = []
+    for name in order:
+        column = columns.get(name) or {'status': name, 'count': (totals or {}).get(name, 0), 'tasks': [], 'next_cursor': None}
+        column.pop('_last', None)
+        result.append(column)
+    return jsonify({'success': True, 'columns': result})
 
 @api.route('/tasks', methods=['POST'])
 @login_required
@@ -778,7 +997,7 @@ def create_task():
     if not title:
         return jsonify({'success': False, 'error': 'Başlık zorunludur'}), 400
 
-    # Çoklu atama desteği: assigned_to_ids varsa döngü ile birden fazla görev
+    # Çoklu atama desteği: assigned_to_ids varsa her kişi için bir görev (toplu oluşturulur)
     assigned_to_id = data.get('assigned_to_id')
     assigned_to_ids = data.get('assigned_to_ids') or []
     if isinstance(assigned_to_ids, list):
@@ -800,97 +1019,98 @@ def create_task():
     is_recurring = data.get('is_recurring', False)
     recurrence = data.get('recurrence', 'none')
 
-    # Yardımcı: tek görev oluşturma
-    def build_and_persist_task(assignee_id):
-        task = Task(
-            title=title,
-            description=description,
-            department_id=current_user.department_id,
-            created_by_id=current_user.id,
-            priority=priority,
-            is_recurring=is_recurring,
-            recurrence=recurrence,
-        )
-        if start_date:
-            task.start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        if due_date:
-            task.due_date = datetime.strptime(due_date, '%Y-%m-%d').date()
-
-        # Policy update: everyone can assign tasks to anyone
-        # Normalize assignee
-        if assignee_id:
-            assignee = User.query.get(assignee_id)
-            if not assignee:
-                raise ValueError('Atanacak kullanıcı bulunamadı')
-        # Status and assignment
-        task.status = 'pending'
-        task.assigned_by_id = current_user.id
-        task.assigned_to_id = assignee_id
-        db.session.add(task)
-        db.session.flush()
-        return task
-
-    created_tasks = []
     try:
-        targets = assigned_to_ids if assigned_to_ids else [assigned_to_id]
-        if not targets:
-            targets = [None]
-        for tid in targets:
-            created_tasks.append(build_and_persist_task(tid))
+        parsed_start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        parsed_due = datetime.strptime(due_date, '%Y-%m-%d').date() if due_date else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih formatı. YYYY-MM-DD kullanın'}), 400
+
+    targets = list(dict.fromkeys(assigned_to_ids)) if assigned_to_ids else [assigned_to_id]
+
+    # Policy update: everyone can assign tasks to anyone
+    # Atananlar tek sorguda doğrulanır
+    assignee_ids = [tid for tid in targets if tid]
+    if assignee_ids:
+        found = {uid for (uid,) in db.session.query(User.id).filter(User.id.in_(assignee_ids)).all()}
+        if len(found) != len(assignee_ids):
+            return jsonify({'success': False, 'error': 'Atanacak kullanıcı bulunamadı'}), 400
+
+    # Tüm görevler tek toplu INSERT ... RETURNING ile yazılır (atanan başına ayrı INSERT/flush yok).
+    # Satırlar sırasız dönebileceği için atanan id'si de döndürülür; görev tekrar satırları ardından toplu üretilir.
+    now = datetime.utcnow()
+    task_rows = [dict(
+        title=title,
+        description=description,
+        department_id=current_user.department_id,
+        created_by_id=current_user.id,
+        priority=priority,
+        is_recurring=bool(is_recurring),
+        recurrence=recurrence,
+        start_date=parsed_start,
+        due_date=parsed_due,
+        status='pending',
+        assigned_by_id=current_user.id,
+        assigned_to_id=tid,
+        created_at=now,
+        updated_at=now
+    ) for tid in targets]
+    try:
+        result = db.session.execute(insert(Task).returning(Task.id, Task.assigned_to_id), task_rows)
+        created = sorted((task_id, assignee_id) for task_id, assignee_id in result.all())
+        resync_task_occurrences([task_id for task_id, _ in created])
+        reindex_tasks([task_id for task_id, _ in created])
+        refresh_task_day_activity([task_id for task_id, _ in created])
         db.session.commit()
-    except PermissionError as pe:
-        db.session.rollback()
-        return jsonify({'success': False, 'error': str(pe)}), 403
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-    # Bildirimler: atanan kullanıcı(lar)a, DM'ye ve adminlere haber ver
+    # Bildirimler: atanan kullanıcı(lar)a, DM'ye ve adminlere haber ver (tek toplu INSERT)
     try:
+        rows = []
         # Assigned user notification
-        for task in created_tasks:
-            if task.assigned_to_id:
-                db.session.add(Notification(
-                    to_user_id=task.assigned_to_id,
+        for task_id, assignee_id in created:
+            if assignee_id:
+                rows.append(dict(
+                    to_user_id=assignee_id,
                     created_by_id=current_user.id,
                     title='Yeni Görev',
                     message=f"Size yeni bir görev atandı: {title}",
                     url='/tasks',
                     entity_type='task',
-                    entity_id=task.id
-                ))
-        # Department manager notification
-        if current_user.department_id:
-            manager = User.query.filter_by(role=UserRole.DEPARTMENT_MANAGER, department_id=current_user.department_id).first()
-            if manager and manager.id != current_user.id:
-                db.session.add(Notification(
-                    to_user_id=manager.id,
-                    created_by_id=current_user.id,
-                    title='Yeni Görev Oluşturuldu',
-                    message=f"{current_user.get_full_name()} yeni görev oluşturdu: {title}",
-                    url='/tasks',
-                    entity_type='task',
-                    entity_id=task.id
+                    entity_id=task_id
                 ))
-        # Admin notifications
-        admins = User.query.filter_by(role=UserRole.ADMIN).all()
-        for adm in admins:
-            if adm.id != current_user.id:
-                db.session.add(Notification(
-                    to_user_id=adm.id,
+        # Department manager + admin notifications (alıcılar önbellekten)
+        last_task_id = created[-1][0]
+        manager_id = department_manager_id(current_user.department_id)
+        if manager_id and manager_id != current_user.id:
+            rows.append(dict(
+                to_user_id=manager_id,
+                created_by_id=current_user.id,
+                title='Yeni Görev Oluşturuldu',
+                message=f"{current_user.get_full_name()} yeni görev oluşturdu: {title}",
+                url='/tasks',
+                entity_type='task',
+                entity_id=last_task_id
+            ))
+        for uid in admin_ids():
+            if uid != current_user.id:
+                rows.append(dict(
+                    to_user_id=uid,
                     created_by_id=current_user.id,
                     title='Görev Etkinliği',
                     message=f"{current_user.get_full_name()} görev oluşturdu: {title}",
                     url='/tasks',
                     entity_type='task',
-                    entity_id=task.id
+                    entity_id=last_task_id
                 ))
+        send_notifications(rows)
         db.session.commit()
     except Exception:
         db.session.rollback()
 
     # Çoklu görev durumunda tüm id'leri döndür
-    return jsonify({'success': True, 'task_ids': [t.id for t in created_tasks]}), 201
+    return jsonify({'success': True, 'task_ids': [task_id for task_id, _ in created]}), 201
 
 @api.route('/tasks/<int:task_id>', methods=['GET', 'PUT'])
 @login_required
@@ -990,32 +1210,13 @@ def approve_task(task_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-    # Onay bildirimi gönder
+    # Onay bildirimi: oluşturana, departman yöneticisine ve adminlere (kendine gönderilmez)
     try:
-        notify_user_ids = set()
-        if task.created_by_id:
-            notify_user_ids.add(task.created_by_id)
-        if task.department_id:
-            dm = User.query.filter_by(role=UserRole.DEPARTMENT_MANAGER, department_id=task.department_id).first()
-            if dm:
-                notify_user_ids.add(dm.id)
-        # Adminlere de bilgi ver
-        admins = User.query.filter_by(role=UserRole.ADMIN).all()
-        for adm in admins:
-            notify_user_ids.add(adm.id)
-        # Kendine bildirim gönderme
-        notify_user_ids.discard(current_user.id)
-
-        for uid in notify_user_ids:
-            db.session.add(Notification(
-                to_user_id=uid,
-                created_by_id=current_user.id,
-                title='Görev Onayı',
-                message=f"{current_user.get_full_name()} bir görevi onayladı: {task.title}",
-                url='/tasks',
-                entity_type='task',
-                entity_id=task.id
-            ))
+        notify(event_recipients(task.department_id, extra=[task.created_by_id], exclude=current_user.id),
+               created_by_id=current_user.id,
+               title='Görev Onayı',
+               message=f"{current_user.get_full_name()} bir görevi onayladı: {task.title}",
+               entity_id=task.id)
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -1053,27 +1254,11 @@ def deliver_task(task_id):
 
     # Teslim bildirimi gönder
     try:
-        notify_user_ids = set()
-        if task.created_by_id:
-            notify_user_ids.add(task.created_by_id)
-        if task.department_id:
-            dm = User.query.filter_by(role=UserRole.DEPARTMENT_MANAGER, department_id=task.department_id).first()
-            if dm:
-                notify_user_ids.add(dm.id)
-        admins = User.query.filter_by(role=UserRole.ADMIN).all()
-        for adm in admins:
-            notify_user_ids.add(adm.id)
-        notify_user_ids.discard(current_user.id)
-        for uid in notify_user_ids:
-            db.session.add(Notification(
-                to_user_id=uid,
-                created_by_id=current_user.id,
-                title='Görev Teslim Edildi',
-                message=f"{current_user.get_full_name()} görevi teslim etti: {task.title}",
-                url='/tasks',
-                entity_type='task',
-                entity_id=task.id
-            ))
+        notify(event_recipients(task.department_id, extra=[task.created_by_id], exclude=current_user.id),
+               created_by_id=current_user.id,
+               title='Görev Teslim Edildi',
+               message=f"{current_user.get_full_name()} görevi teslim etti: {task.title}",
+               entity_id=task.id)
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -1082,6 +1267,163 @@ def deliver_task(task_id):
 
 
 
+TASK_BULK_MAX_IDS = 500
+# İşlem: (uygun durumlar, yeni durum, bildirim başlığı, bildirim metni)
+TASK_BULK_STATUS_ACTIONS = {
+    'approve': (('pending', 'requested'), 'in_progress', 'Görev Onayı', '{name} bir görevi onayladı: {title}'),
+    'deliver': (('in_progress', 'pending', 'requested'), 'completed', 'Görev Teslim Edildi', '{name} görevi teslim etti: {title}'),
+}
+
+def bulk_task_denial(action, task, scoped_ids, today):
+    """Tek görev için tekil uç noktalarla aynı kurallar; uygunsa None, değilse hata metni"""
+    if action in TASK_BULK_STATUS_ACTIONS:
+        if not task.assigned_to_id or task.assigned_to_id != current_user.id:
+            return 'Bu görev üzerinde yetkiniz yok'
+        if (task.status or '').lower() not in TASK_BULK_STATUS_ACTIONS[action][0]:
+            return 'Görev bu durumda işlenemez'
+        if action == 'deliver' and task.due_date is not None and task.due_date < today:
+            return 'Görev geciktiği için teslim edilemez'
+        return None
+    if action == 'reassign':
+        if not (current_user.is_admin() or current_user.is_department_manager()):
+            return 'Görevi güncelleme yetkiniz yok'
+        if scoped_ids is not None and (task.assigned_to_id or current_user.id) not in scoped_ids and task.created_by_id not in scoped_ids:
+            return 'Göreve erişim yetkiniz yok'
+        return None
+    # delete
+    if current_user.is_admin():
+        return None
+    if current_user.is_department_manager() and current_user.department_id in (
+            task.department_id, task.assignee_department_id, task.creator_department_id):
+        return None
+    return 'Silme yetkiniz yok'
+
+@api.route('/tasks/bulk', methods=['POST'])
+@login_required
+def bulk_tasks():
+    """Birden çok görevde tek istekle işlem.
+    Gövde: {action: 'approve' | 'deliver' | 'reassign' | 'delete', task_ids: [...], assigned_to_id (reassign için)}
+    Yetki tüm id'ler için tek sorguda kontrol edilir; biri bile uygun değilse hiçbir değişiklik yapılmaz.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in ('approve', 'deliver', 'reassign', 'delete'):
+        return jsonify({'success': False, 'error': 'Geçersiz işlem'}), 400
+    try:
+        task_ids = sorted({int(i) for i in data.get('task_ids') or []})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'task_ids geçersiz'}), 400
+    if not task_ids or len(task_ids) > TASK_BULK_MAX_IDS:
+        return jsonify({'success': False, 'error': f'1 ile {TASK_BULK_MAX_IDS} arasında görev seçin'}), 400
+
+    new_assignee = None
+    if action == 'reassign':
+        try:
+            new_assignee = int(data['assigned_to_id']) if data.get('assigned_to_id') not in (None, '') else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'assigned_to_id geçersiz'}), 400
+        if new_assignee and not db.session.query(User.id).filter_by(id=new_assignee).first():
+            return jsonify({'success': False, 'error': 'Atanacak kullanıcı bulunamadı'}), 400
+        if new_assignee and not is_user_in_scope(new_assignee):
+            return jsonify({'success': False, 'error': 'Bu kullanıcıya atama yetkiniz yok'}), 403
+
+    # Yetki kontrolü için gereken tüm alanlar (atanan/oluşturan departmanları dahil) tek sorguda
+    assignee, creator = aliased(User), aliased(User)
+    tasks = db.session.query(
+        Task.id, Task.title, Task.status, Task.due_date, Task.department_id,
+        Task.assigned_to_id, Task.created_by_id,
+        assignee.department_id.label('assignee_department_id'),
+        creator.department_id.label('creator_department_id')
+    ).outerjoin(assignee, assignee.id == Task.assigned_to_id).outerjoin(
+        creator, creator.id == Task.created_by_id
+    ).filter(Task.id.in_(task_ids)).all()
+    missing = sorted(set(task_ids) - {t.id for t in tasks})
+    if missing:
+        return jsonify({'success': False, 'error': 'Görev bulunamadı', 'task_ids': missing}), 404
+    scoped_ids = set(get_scoped_user_ids() or []) if action == 'reassign' and not current_user.is_admin() else None
+    today = today_tr()
+    denied = {t.id: reason for t in tasks if (reason := bulk_task_denial(action, t, scoped_ids, today))}
+    if denied:
+        return jsonify({'success': False, 'error': next(iter(denied.values())),
+                        'denied': [{'id': i, 'error': e} for i, e in sorted(denied.items())]}), 403
+
+    now = datetime.utcnow()
+    notifications = []
+    try:
+        if action in TASK_BULK_STATUS_ACTIONS:
+            allowed, new_status, title, message = TASK_BULK_STATUS_ACTIONS[action]
+            db.session.execute(
+                update(Task).where(Task.id.in_(task_ids), Task.status.in_(allowed))
+                .values(status=new_status, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            # Alıcılar: oluşturan, görevin departman yöneticisi ve adminler (önbellekten)
+            name = current_user.get_full_name()
+            for t in tasks:
+                notify_user_ids = event_recipients(t.department_id, extra=[t.created_by_id], exclude=current_user.id)
+                notifications.extend(dict(
+                    to_user_id=uid,
+                    created_by_id=current_user.id,
+                    title=title,
+                    message=message.format(name=name, title=t.title),
+                    url='/tasks',
+                    entity_type='task',
+                    entity_id=t.id
+                ) for uid in sorted(notify_user_ids))
+        elif action == 'reassign':
+            db.session.execute(
+                update(Task).where(Task.id.in_(task_ids))
+                .values(assigned_to_id=new_assignee, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            resync_task_occurrences(task_ids)
+            reindex_tasks(task_ids)
+            refresh_day_activity({new_assignee} | {t.assigned_to_id for t in tasks} | {t.created_by_id for t in tasks})
+            if new_assignee and new_assignee != current_user.id:
+                notifications.extend(dict(
+                    to_user_id=new_assignee,
+                    created_by_id=current_user.id,
+                    title='Yeni Görev',
+                    message=f"Size yeni bir görev atandı: {t.title}",
+                    url='/tasks',
+                    entity_type='task',
+                    entity_id=t.id
+                ) for t in tasks if t.assigned_to_id != new_assignee)
+        else:
+            # Yorumlar ve türetilmiş satırlar görevden önce silinir (SQLite'ta FK cascade kapalı)
+            db.session.execute(delete(TaskComment).where(TaskComment.task_id.in_(task_ids)))
+            db.session.execute(delete(TaskOccurrence).where(TaskOccurrence.task_id.in_(task_ids)))
+            db.session.execute(delete(TaskReminder).where(TaskReminder.task_id.in_(task_ids)))
+            db.session.execute(delete(Task).where(Task.id.in_(task_ids)).execution_options(synchronize_session=False))
+            reindex_tasks(task_ids)
+            refresh_day_activity({t.assigned_to_id for t in tasks} | {t.created_by_id for t in tasks})
+            db.session.execute(insert(ActivityLog), [dict(
+                user_id=current_user.id,
+                action='task_deleted',
+                description=f'Görev silindi: {t.id} - {t.title}',
+                created_at=now
+            ) for t in tasks])
+        send_notifications(notifications)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[ERROR] Toplu görev işlemi hatası ({action}): {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    return jsonify({'success': True, 'action': action, 'task_ids': task_ids}), 200
+
+
+TASK_COMMENT_PAGE_SIZE = 50
+TASK_COMMENT_MAX_LIMIT = 200
+
+def recount_task_comments(task_ids):
+    """Toplu yorum silme sonrası sayaçları yeniden hesapla"""
+    if not task_ids:
+        return
+    counts = select(func.count(TaskComment.id)).where(TaskComment.task_id == Task.id).scalar_subquery()
+    db.session.execute(update(Task).where(Task.id.in_(task_ids)).values(comment_count=counts)
+                       .execution_options(synchronize_session=False))
+
 @api.route('/tasks/<int:task_id>/comments', methods=['GET', 'POST'])
 @login_required
 def task_comments(task_id):
@@ -1090,14 +1432,33 @@ def task_comments(task_id):
         return jsonify({'success': False, 'error': 'Göreve erişim yetkiniz yok'}), 403
 
     if request.method == 'GET':
-        comments = TaskComment.query.filter_by(task_id=task_id).order_by(TaskComment.created_at.asc()).all()
+        # Sayfalı: order=asc|desc (varsayılan asc), limit (varsayılan 50), cursor = son görülen yorum id'si
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'success': False, 'error': 'Geçersiz sıralama'}), 400
+        limit = max(1, min(request.args.get('limit', TASK_COMMENT_PAGE_SIZE, type=int), TASK_COMMENT_MAX_LIMIT))
+        cursor = request.args.get('cursor', type=int)
+        query = TaskComment.query.filter_by(task_id=task_id)
+        if cursor:
+            query = query.filter(TaskComment.id > cursor if order == 'asc' else TaskComment.id < cursor)
+        query = query.order_by(TaskComment.id.asc() if order == 'asc' else TaskComment.id.desc())
+        comments = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = comments[-1].id
+        # Yazarlar tek sorguda
+        author_ids = {c.user_id for c in comments}
+        authors = {u.id: u for u in User.query.filter(User.id.in_(author_ids)).all()} if author_ids else {}
         return jsonify({
             'success': True,
+            'total': task.comment_count,
+            'next_cursor': next_cursor,
             'comments': [{
                 'id': c.id,
                 'task_id': c.task_id,
                 'user_id': c.user_id,
-                'user_name': c.user.get_full_name() if c.user else '-',
+                'user_name': authors[c.user_id].get_full_name() if c.user_id in authors else '-',
                 'comment': c.comment,
                 'created_at': c.created_at.isoformat(),
             } for c in comments]
@@ -1109,38 +1470,74 @@ def task_comments(task_id):
         return jsonify({'success': False, 'error': 'Yorum zorunludur'}), 400
     c = TaskComment(task_id=task_id, user_id=current_user.id, comment=text)
     db.session.add(c)
+    # Sayaç atomik artırılır (eşzamanlı yorumlarda kayıp olmaz)
+    db.session.execute(update(Task).where(Task.id == task_id).values(comment_count=Task.comment_count + 1)
+                       .execution_options(synchronize_session=False))
     db.session.commit()
-    # Yorum bildirimi gönder
+    # Yorum bildirimi: atanan, oluşturan, departman yöneticisi ve adminler (kendine gönderilmez)
     try:
-        notify_user_ids = set()
-        if task.assigned_to_id:
-            notify_user_ids.add(task.assigned_to_id)
-        if task.created_by_id:
-            notify_user_ids.add(task.created_by_id)
-        if task.department_id:
-            dm = User.query.filter_by(role=UserRole.DEPARTMENT_MANAGER, department_id=task.department_id).first()
-            if dm:
-                notify_user_ids.add(dm.id)
-        # Adminler
-        for adm in User.query.filter_by(role=UserRole.ADMIN).all():
-            notify_user_ids.add(adm.id)
-        # Kendine bildirim gönderme
-        notify_user_ids.discard(current_user.id)
-        for uid in notify_user_ids:
-            db.session.add(Notification(
-                to_user_id=uid,
-                created_by_id=current_user.id,
-                title='Görev Yorumu',
-                message=f"{current_user.get_full_name()} bir yorum ekledi.",
-                url='/tasks',
-                entity_type='task',
-                entity_id=task_id
-            ))
+        notify(event_recipients(task.department_id, extra=[task.assigned_to_id, task.created_by_id], exclude=current_user.id),
+               created_by_id=current_user.id,
+               title='Görev Yorumu',
+               message=f"{current_user.get_full_name()} bir yorum ekledi.",
+               entity_id=task_id)
         db.session.commit()
     except Exception:
         db.session.rollback()
     return jsonify({'success': True, 'comment_id': c.id}), 201
 
+SEARCH_KINDS = ('plan', 'task', 'comment')
+SEARCH_MAX_LIMIT = 100
+
+@api.route('/search', methods=['GET'])
+@login_required
+def full_text_search():
+    """Planlar, görevler ve yorumlarda tam metin arama (kapsam dahilinde, alakaya göre sıralı).
+    Parametreler: q, types (plan,task,comment), start, end (YYYY-MM-DD), user_id, limit (varsayılan 20), offset
+    """
+    q = (request.args.get('q') or '').strip()
+    if len(q) < 2:
+        return jsonify({'success': False, 'error': 'Arama metni en az 2 karakter olmalı'}), 400
+    kinds = [k for k in (request.args.get('types') or '').split(',') if k]
+    if any(k not in SEARCH_KINDS for k in kinds):
+        return jsonify({'success': False, 'error': 'Geçersiz tür'}), 400
+    user_id = request.args.get('user_id', type=int)
+    if user_id and not is_user_in_scope(user_id):
+        return jsonify({'success': False, 'error': 'Bu kullanıcıya erişim yetkiniz yok'}), 403
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih formatı. YYYY-MM-DD kullanın'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), SEARCH_MAX_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+
+    rows = search_documents(q, kinds=kinds or None, scoped_ids=get_scoped_user_ids(), user_id=user_id,
+                            start=start, end=end, limit=limit + 1, offset=offset)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # Kullanıcı adları ve yorumların görev başlıkları tek sorguda
+    user_ids = {uid for r, _ in rows for uid in (r.user_id, r.other_user_id) if uid}
+    names = {u.id: u.get_full_name() for u in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+    comment_task_ids = {r.task_id for r, _ in rows if r.kind == 'comment'}
+    task_titles = dict(db.session.query(Task.id, Task.title).filter(Task.id.in_(comment_task_ids)).all()) if comment_task_ids else {}
+    results = []
+    for r, snippet in rows:
+        # Planlarda sahip temsilcidir; görev/yorumda atanan (yoksa oluşturan)
+        owner_id = r.user_id or r.other_user_id
+        results.append({
+            'type': r.kind,
+            'id': r.source_id,
+            'task_id': r.task_id,
+            'user_id': owner_id,
+            'user_name': names.get(owner_id, '-'),
+            'date': r.day.isoformat() if r.day else None,
+            'title': task_titles.get(r.task_id) if r.kind == 'comment' else r.title,
+            'snippet': snippet_html(snippet),
+            'url': '/planning-archive' if r.kind == 'plan' else '/tasks'
+        })
+    return jsonify({'success': True, 'results': results, 'next_offset': offset + limit if has_more else None})
+
 # Bildirim API'leri
 @api.route('/notifications', methods=['GET'])
 @login_required
@@ -1153,18 +1550,167 @@ def list_notifications():
     notifs = q.order_by(Notification.created_at.desc()).limit(50).all()
     return jsonify({
         'success': True,
-        'notifications': [{
-            'id': n.id,
-            'title': n.title,
-            'message': n.message,
-            'url': n.url,
-            'entity_type': n.entity_type,
-            'entity_id': n.entity_id,
-            'is_read': n.is_read,
-            'created_at': n.created_at.isoformat()
-        } for n in notifs]
+        'notifications': [notification_payload(n) for n in notifs]
     })
 
+def notification_payload(n: Notification):
+    return {
+        'id': n.id,
+        'title': n.title,
+        'message': n.message,
+        'url': n.url,
+        'entity_type': n.entity_type,
+        'entity_id': n.entity_id,
+        'is_read': n.is_read,
+        'created_at': n.created_at.isoformat()
+    }
+
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 25
+NOTIFICATION_STREAM_BATCH = 50
+
+def sse_message(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+@api.route('/notifications/stream', methods=['GET'])
+@login_required
+def notification_stream():
+    """Server-Sent Events: yeni bildirimler ('notification') ve okunmamış sayısı ('unread').
+    Bağlantı NOTIFICATION_STREAM_MAX_SECONDS sonra kapanır; EventSource Last-Event-ID ile
+    kaldığı yerden yeniden bağlanır. Kapalıysa veya worker'daki akış sınırı
+    (NOTIFICATION_STREAM_MAX_PER_WORKER) doluysa 503 döner, istemci yoklamaya geçer.
+    """
+    if not current_app.config.get('NOTIFICATION_STREAM_ENABLED'):
+        return jsonify({'success': False, 'error': 'Bildirim akışı kapalı'}), 503
+    if not acquire_stream_slot(current_app.config.get('NOTIFICATION_STREAM_MAX_PER_WORKER', 12)):
+        return jsonify({'success': False, 'error': 'Bildirim akışı kapasitesi dolu'}), 503
+    app = current_app._get_current_object()
+    user_id = current_user.id
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = db.session.query(func.max(Notification.id)).filter(Notification.to_user_id == user_id).scalar() or 0
+    max_seconds = app.config.get('NOTIFICATION_STREAM_MAX_SECONDS', 300)
+    ensure_relay(db.engine)
+
+    def changes(after_id):
+        """Akış kendi uygulama bağlamında okur: istek bağlamı yanıt dönünce kapanır"""
+        with app.app_context():
+            rows = Notification.query.filter(
+                Notification.to_user_id == user_id, Notification.id > after_id
+            ).order_by(Notification.id.asc()).limit(NOTIFICATION_STREAM_BATCH).all()
+            return [notification_payload(n) for n in rows], unread_notification_count(user_id)
+
+    def generate():
+        nonlocal last_id
+        subscription = subscribe(user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            new, count = changes(last_id)
+            deadline = time.monotonic() + max_seconds
+            while True:
+                for payload in new:
+                    last_id = payload['id']
+                    yield sse_message('notification', payload, payload['id'])
+                yield sse_message('unread', {'count': count})
+                try:
+                    subscription.get(timeout=min(NOTIFICATION_STREAM_HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0.1)))
+                except queue.Empty:
+                    if time.monotonic() >= deadline:
+                        return
+                    yield ': ping\n\n'
+                    continue
+                # Art arda gelen sinyaller tek okumada birleştirilir
+                while not subscription.empty():
+                    subscription.get_nowait()
+                new, count = changes(last_id)
+        finally:
+            unsubscribe(user_id, subscription)
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    # Yer, üreteç hiç başlamasa da yanıt kapanınca bırakılır
+    response.call_on_close(release_stream_slot)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api.route('/tasks/agenda', methods=['GET'])
+@login_required
+def task_agenda():
+    """Tarih aralığındaki görev tekrarları (gün gün). Parametreler: start, end (YYYY-MM-DD, varsayılan bugün +7 gün),
+    user_id (Admin/DM). En fazla 366 gün.
+    """
+    requested_user_id = request.args.get('user_id', type=int)
+    if requested_user_id and not is_user_in_scope(requested_user_id):
+        return jsonify({'success': False, 'error': 'Bu kullanıcıya erişim yetkiniz yok'}), 403
+    user_id = requested_user_id or current_user.id
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else today_tr()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start + timedelta(days=7)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih formatı. YYYY-MM-DD kullanın'}), 400
+    if end < start or (end - start).days > 366:
+        return jsonify({'success': False, 'error': 'Geçersiz tarih aralığı'}), 400
+
+    if ensure_occurrence_horizon(end):
+        db.session.commit()
+    rows = occurrence_query([user_id], start, end).order_by(TaskOccurrence.date.asc(), Task.id.asc()).all()
+    days = {}
+    for day, t in rows:
+        days.setdefault(day.isoformat(), []).append({
+            'id': t.id,
+            'title': t.title,
+            'status': t.status,
+            'priority': t.priority,
+            'due_date': t.due_date.isoformat() if t.due_date else None,
+            'is_recurring': t.is_recurring,
+            'recurrence': t.recurrence
+        })
+    return jsonify({'success': True, 'user_id': user_id, 'start': start.isoformat(), 'end': end.isoformat(),
+                    'days': [{'date': d, 'tasks': items} for d, items in days.items()]})
+
+def calendar_feed_url(token):
+    return f"{request.host_url.rstrip('/')}/api/calendar/{token}.ics"
+
+@api.route('/calendar/token', methods=['GET', 'POST'])
+@login_required
+def calendar_token():
+    """Kişisel .ics akış adresi. GET mevcut anahtarı (yoksa oluşturur), POST anahtarı yeniler (eski adres geçersizleşir)."""
+    import secrets
+    entry = CalendarToken.query.filter_by(user_id=current_user.id).first()
+    if entry is None:
+        entry = CalendarToken(user_id=current_user.id, token=secrets.token_urlsafe(32))
+        db.session.add(entry)
+        db.session.commit()
+    elif request.method == 'POST':
+        entry.token = secrets.token_urlsafe(32)
+        entry.created_at = datetime.utcnow()
+        db.session.commit()
+    return jsonify({'success': True, 'url': calendar_feed_url(entry.token)})
+
+@api.route('/calendar/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    """Görevler (tekrarlı olanlar RRULE ile) ve son günlük planlar. Oturum gerekmez, anahtar yeterlidir."""
+    from ical import feed_version, cached_feed
+    entry = CalendarToken.query.filter_by(token=token).first()
+    user = db.session.get(User, entry.user_id) if entry else None
+    if user is None or not user.is_active:
+        return jsonify({'success': False, 'error': 'Takvim bulunamadı'}), 404
+
+    today = today_tr()
+    etag, last_modified = feed_version(user.id, today)
+    response = current_app.response_class(mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, max-age=300'
+    # 304 yalnız ETag ile: görev silinince en son güncelleme zamanı geriye gidebilir, If-Modified-Since
+    # tek başına silinen görevi gizleyemez (sayı ETag'e dahildir)
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    response.set_data(cached_feed(user, request.host_url.rstrip('/'), today, etag))
+    response.headers['Content-Disposition'] = 'inline; filename="gorevler.ics"'
+    return response
+
 @api.route('/tasks/due-soon', methods=['GET'])
 @login_required
 def tasks_due_soon():
@@ -1211,43 +1757,29 @@ def tasks_due_soon():
 @api.route('/notifications/unread-count', methods=['GET'])
 @login_required
 def unread_notifications_count():
-    cnt = Notification.query.filter_by(to_user_id=current_user.id, is_read=False).count()
+    cnt = unread_notification_count(current_user.id)
     return jsonify({'success': True, 'count': cnt})
 
 @api.route('/notifications/<int:notif_id>/read', methods=['POST'])
 @login_required
 def mark_notification_read(notif_id):
     notif = Notification.query.filter_by(id=notif_id, to_user_id=current_user.id).first_or_404()
-    notif.is_read = True
-    notif.read_at = datetime.utcnow()
+    # Koşullu UPDATE: sayaç yalnız okunmamıştan okunmuşa geçişte azalır
+    mark_read(notif.id, current_user.id)
     db.session.commit()
 
-    # Okundu bildirimi: kullanıcının yöneticisine ve adminlere haber ver
+    # Okundu bildirimi: kullanıcının yöneticisine ve adminlere haber ver (kendine gönderilmez)
     try:
-        notify_user_ids = set()
-        # Departman yöneticisi
-        if current_user.department_id:
-            dm = User.query.filter_by(role=UserRole.DEPARTMENT_MANAGER, department_id=current_user.department_id).first()
-            if dm:
-                notify_user_ids.add(dm.id)
-        # Adminler
-        for adm in User.query.filter_by(role=UserRole.ADMIN).all():
-            notify_user_ids.add(adm.id)
-        # Kendine bildirim gönderme
-        notify_user_ids.discard(current_user.id)
         message = f"{current_user.get_full_name()} bir bildirimi görüntüledi."
         if notif.entity_type == 'task' and notif.entity_id:
             message = f"{current_user.get_full_name()} görev bildirimi görüntüledi (ID: {notif.entity_id})."
-        for uid in notify_user_ids:
-            db.session.add(Notification(
-                to_user_id=uid,
-                created_by_id=current_user.id,
-                title='Bildirim Görüntülendi',
-                message=message,
-                url=notif.url or '/tasks',
-                entity_type=notif.entity_type,
-                entity_id=notif.entity_id
-            ))
+        notify(event_recipients(current_user.department_id, exclude=current_user.id),
+               created_by_id=current_user.id,
+               title='Bildirim Görüntülendi',
+               message=message,
+               url=notif.url or '/tasks',
+               entity_type=notif.entity_type,
+               entity_id=notif.entity_id)
         db.session.commit()
     except Exception:
         db.session.rollback()
@@ -1260,6 +1792,8 @@ def delete_all_notifications():
     try:
         # Kullanıcının tüm bildirimlerini sil
         deleted_count = Notification.query.filter_by(to_user_id=current_user.id).delete()
+        recount_unread([current_user.id])
+        mark_changed(db.session, [current_user.id])
         db.session.commit()
         
         return jsonify({
@@ -1601,9 +2135,419 @@ def create_return():
     db.session.commit()
     
     log_activity('return_create', f'İade kaydı oluşturuldu: {data["product_name"]}')
-    
+
     return jsonify({'message': 'İade kaydı oluşturuldu', 'id': ret.id}), 201
 
+# Satış / iade ham veri dışa aktarımı (CSV veya XLSX, satır sayısından bağımsız bellek)
+def fact_export_response(report_type):
+    from flask import Response, stream_with_context
+    from exports import (FACT_EXPORT_MODELS, fact_export_statement, fact_export_headers, iter_fact_rows, iter_csv,
+                         new_write_only_workbook, write_rows_workbook, save_to_spool, XLSX_MIMETYPE)
+
+    try:
+        user_ids, params, download_name = resolve_export_request(report_type, request.args)
+    except ValueError as ve:
+        return jsonify({'success': False, 'error': str(ve)}), 400
+    except PermissionError as pe:
+        return jsonify({'success': False, 'error': str(pe)}), 403
+
+    model, sheet_title = FACT_EXPORT_MODELS[report_type]
+    stmt = fact_export_statement(model, user_ids, params['start_date'], params['end_date'])
+    headers = fact_export_headers(model)
+
+    if params['format'] == 'csv':
+        response = Response(
+            stream_with_context(iter_csv(headers, iter_fact_rows(stmt))),
+            mimetype='text/csv; charset=utf-8'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+        return response
+
+    wb = write_rows_workbook(new_write_only_workbook(), sheet_title, headers, iter_fact_rows(stmt))
+    return send_file(save_to_spool(wb), mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=download_name)
+
+@api.route('/sales/export', methods=['GET'])
+@login_required
+def export_sales():
+    """Satış satırlarını dışa aktar. Parametreler: format=csv|xlsx, start_date, end_date, representative_id"""
+    try:
+        return fact_export_response('sales')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/returns/export', methods=['GET'])
+@login_required
+def export_returns():
+    """İade satırlarını dışa aktar. Parametreler: format=csv|xlsx, start_date, end_date, representative_id"""
+    try:
+        return fact_export_response('returns')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Arka plan dışa aktarım işleri (büyük raporlar istek süresine bağlı kalmadan üretilir)
+def can_access_export_job(job) -> bool:
+    if current_user.is_admin() or job.created_by_id == current_user.id:
+        return True
+    if job.scope is None:
+        return False
+    allowed = get_scoped_user_ids()
+    return allowed is None or set(json.loads(job.scope)).issubset(allowed)
+
+def export_job_payload(job):
+    return {
+        'id': job.id,
+        'report_type': job.report_type,
+        'status': job.status,
+        'file_size': job.file_size,
+        'download_name': job.download_name,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': f'/api/exports/{job.id}/download' if job.status == 'ready' else None
+    }
+
+@api.route('/exports', methods=['POST'])
+@login_required
+def create_export_job():
+    """Dışa aktarım işi oluştur. Gövde: {report_type: sales|returns|planning, ...rapor parametreleri}.
+    Aynı kapsam/parametre/veri sürümü için hazır veya çalışan bir iş varsa o döner (dosya yeniden üretilmez).
+    """
+    from werkzeug.datastructures import MultiDict
+    from exports import export_data_version, export_cache_key, export_job_file_path, start_export_job, gc_export_files
+
+    data = request.get_json(silent=True) or {}
+    report_type = data.get('report_type')
+    args = MultiDict({k: v for k, v in data.items() if v is not None and k != 'report_type'})
+    try:
+        scope, params, download_name = resolve_export_request(report_type, args)
+    except ValueError as ve:
+        return jsonify({'success': False, 'error': str(ve)}), 400
+    except PermissionError as pe:
+        return jsonify({'success': False, 'error': str(pe)}), 403
+
+    try:
+        app = current_app._get_current_object()
+        gc_export_files(app)
+        cache_key = export_cache_key(report_type, scope, params, export_data_version(report_type, scope, params))
+
+        job = ExportJob.query.filter(
+            ExportJob.cache_key == cache_key,
+            ExportJob.status.in_(['pending', 'running', 'ready'])
+        ).order_by(ExportJob.id.desc()).first()
+        if job and job.status == 'ready' and not os.path.exists(export_job_file_path(app, job)):
+            db.session.delete(job)
+            job = None
+        if job:
+            job.last_accessed_at = datetime.utcnow()
+            db.session.commit()
+            return jsonify({'success': True, 'cached': True, 'job': export_job_payload(job)})
+
+        extension = 'csv' if params.get('format') == 'csv' else 'xlsx'
+        job = ExportJob(
+            cache_key=cache_key,
+            report_type=report_type,
+            params=json.dumps(params),
+            scope=json.dumps(scope) if scope is not None else None,
+            status='pending',
+            file_name=f'{cache_key}.{extension}',
+            download_name=download_name,
+            created_by_id=current_user.id
+        )
+        db.session.add(job)
+        db.session.commit()
+        start_export_job(app, job.id)
+        return jsonify({'success': True, 'cached': False, 'job': export_job_payload(job)}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/exports/<int:job_id>', methods=['GET'])
+@login_required
+def get_export_job(job_id):
+    """Dışa aktarım işinin durumu (pending, running, ready, failed)"""
+    job = db.session.get(ExportJob, job_id)
+    if not job or not can_access_export_job(job):
+        return jsonify({'success': False, 'error': 'İş bulunamadı'}), 404
+    return jsonify({'success': True, 'job': export_job_payload(job)})
+
+@api.route('/exports/<int:job_id>/download', methods=['GET'])
+@login_required
+def download_export_job(job_id):
+    """Hazır dışa aktarım dosyasını indir"""
+    from exports import export_job_file_path, XLSX_MIMETYPE
+
+    job = db.session.get(ExportJob, job_id)
+    if not job or not can_access_export_job(job):
+        return jsonify({'success': False, 'error': 'İş bulunamadı'}), 404
+    if job.status != 'ready':
+        return jsonify({'success': False, 'error': 'Dosya henüz hazır değil', 'status': job.status}), 409
+    path = export_job_file_path(current_app, job)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Dosya süresi doldu, yeniden oluşturun'}), 410
+    job.last_accessed_at = datetime.utcnow()
+    db.session.commit()
+    mimetype = 'text/csv; charset=utf-8' if job.file_name.endswith('.csv') else XLSX_MIMETYPE
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=job.download_name)
+
+# BI arşivi (aylık bölümlenmiş gzip CSV + manifest). BI araçları BI_EXPORT_TOKEN ile oturumsuz okur.
+# Arşiv günlük bakım işiyle (maintenance.py, 'bi_archive') yenilenir; POST /api/bi-archive/refresh anında yenileme içindir.
+def bi_archive_authorized() -> bool:
+    """Token yalnız 'Authorization: Bearer <token>' başlığından okunur (sorgu dizesi erişim loglarına düşer)"""
+    import hmac
+    token = current_app.config.get('BI_EXPORT_TOKEN')
+    auth_header = request.headers.get('Authorization', '')
+    supplied = auth_header[len('Bearer '):] if auth_header.startswith('Bearer ') else None
+    if token and supplied and hmac.compare_digest(token, supplied):
+        return True
+    return current_user.is_authenticated and current_user.is_admin()
+
+@api.route('/bi-archive/refresh', methods=['POST'])
+@login_required
+@admin_required
+def refresh_bi_archive_endpoint():
+    """Değişen ay bölümlerini yeniden üret. Gövde (opsiyonel): {tables: ['sales', ...], force: bool}"""
+    from exports import refresh_bi_archive, BI_ARCHIVE_TABLES
+    data = request.get_json(silent=True) or {}
+    tables = data.get('tables')
+    if tables and any(t not in BI_ARCHIVE_TABLES for t in tables):
+        return jsonify({'success': False, 'error': 'Geçersiz tablo'}), 400
+    try:
+        summary = refresh_bi_archive(current_app, tables=tables, force=bool(data.get('force')))
+        log_activity('bi_archive_refresh', f"BI arşivi güncellendi: {len(summary['written'])} bölüm yazıldı")
+        return jsonify({'success': True, **summary})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/bi-archive/manifest.json', methods=['GET'])
+def bi_archive_manifest():
+    """Bölümlerin listesi, satır sayıları, sha256 ve veri sürümleri"""
+    from exports import bi_archive_dir, BI_MANIFEST_NAME
+    from flask import send_from_directory
+    if not bi_archive_authorized():
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'}), 403
+    if not os.path.exists(os.path.join(bi_archive_dir(current_app), BI_MANIFEST_NAME)):
+        return jsonify({'success': False, 'error': 'Arşiv henüz oluşturulmadı'}), 404
+    return send_from_directory(bi_archive_dir(current_app), BI_MANIFEST_NAME, mimetype='application/json', max_age=0)
+
+@api.route('/bi-archive/<table>/<name>', methods=['GET'])
+def bi_archive_file(table, name):
+    """Tek bir ay bölümünü indir (ETag/Last-Modified/Range destekli statik dosya)"""
+    from exports import bi_archive_dir, BI_ARCHIVE_TABLES
+    from flask import send_from_directory
+    if not bi_archive_authorized():
+        return jsonify({'success': False, 'error': 'Yetkiniz yok'}), 403
+    if table not in BI_ARCHIVE_TABLES or not name.endswith('.csv.gz'):
+        return jsonify({'success': False, 'error': 'Dosya bulunamadı'}), 404
+    return send_from_directory(os.path.join(bi_archive_dir(current_app), table), name,
+                               mimetype='application/gzip', as_attachment=True, max_age=0)
+
+# Alış (satın alma) verileri
+PURCHASE_IMPORT_CHUNK = 1000
+
+def parse_erp_number(value, default=0.0) -> float:
+    """ERP alanlarındaki sayıları çevir ("1.234,56" ve "1234.56" biçimleri)"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    s = str(value).strip().replace(' ', '')
+    if ',' in s:
+        s = s.replace('.', '').replace(',', '.')
+    try:
+        return float(s)
+    except ValueError:
+        return default
+
+def parse_erp_date(value):
+    """ERP TARIH alanını (dd.mm.YYYY veya YYYY-mm-dd) date nesnesine çevir"""
+    if not value:
+        return None
+    for fmt in ('%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(str(value).strip()[:10], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def month_bounds(y: int, m: int):
+    """Ayın ilk günü ve bir sonraki ayın ilk günü"""
+    start = date(y, m, 1)
+    end = date(y + 1, 1, 1) if m == 12 else date(y, m + 1, 1)
+    return start, end
+
+def refresh_purchase_monthly(months):
+    """Verilen (yıl, ay) çiftleri için PurchaseMonthly özetini ham satırlardan yeniden üret.
+    Her ay için tek DELETE + tek INSERT ... SELECT ... GROUP BY çalışır.
+    """
+    for (y, m) in sorted(set(months)):
+        start, end = month_bounds(y, m)
+        PurchaseMonthly.query.filter_by(year=y, month=m).delete(synchronize_session=False)
+        grouped = db.select(
+            db.literal(y),
+            db.literal(m),
+            Purchase.product_group,
+            Purchase.brand,
+            func.count(Purchase.id),
+            func.coalesce(func.sum(Purchase.quantity), 0),
+            func.coalesce(func.sum(Purchase.total_price), 0),
+            func.coalesce(func.sum(Purchase.net_price), 0),
+            db.literal(datetime.utcnow()),
+        ).where(
+            Purchase.date >= start,
+            Purchase.date < end
+        ).group_by(Purchase.product_group, Purchase.brand)
+        db.session.execute(db.insert(PurchaseMonthly).from_select(
+            ['year', 'month', 'product_group', 'brand', 'line_count',
+             'total_quantity', 'total_price', 'net_price', 'updated_at'],
+            grouped
+        ))
+
+def build_purchase_rows(records, user_map):
+    """ERP kayıtlarından yalnız 'alis' satırlarını Purchase insert sözlüklerine dönüştür"""
+    rows = []
+    skipped = 0
+    now = datetime.utcnow()
+    for rec in records:
+        if not isinstance(rec, dict) or (rec.get('ALIS_SATIS') or '').strip().lower() != 'alis':
+            continue
+        purchase_date = parse_erp_date(rec.get('TARIH'))
+        if not purchase_date:
+            skipped += 1
+            continue
+        quantity = parse_erp_number(rec.get('ADET'))
+        unit_price = parse_erp_number(rec.get('BIRIMFIYAT'))
+        total_price = parse_erp_number(rec.get('TOPLAMFIYAT'), quantity * unit_price)
+        rep_key = (rec.get('SATISTEMSILCISI') or '').strip().lower()
+        rows.append({
+            'representative_id': user_map.get(rep_key),
+            'date': purchase_date,
+            'invoice_no': rec.get('FATURANO') or None,
+            'supplier_code': rec.get('CARIKODU') or None,
+            'supplier_name': rec.get('CARIADI') or None,
+            'stock_code': rec.get('STOKKODU') or None,
+            'warehouse_code': rec.get('DEPOKODU') or None,
+            'product_group': rec.get('URUN_GRUBU') or rec.get('URUN_ANA_GRUP') or 'Bilinmeyen',
+            'brand': rec.get('MARKA') or 'Bilinmeyen',
+            'product_name': rec.get('STOKADı') or rec.get('STOKADI') or rec.get('STOKKODU') or 'Bilinmeyen',
+            'quantity': int(round(quantity)),
+            'unit_price': unit_price,
+            'total_price': total_price,
+            'net_price': parse_erp_number(rec.get('TOPLAMNETFIYAT'), total_price),
+            'original_quantity': str(rec.get('ADET') or ''),
+            'original_date': str(rec.get('TARIH') or ''),
+            'original_product_group': rec.get('URUN_ANA_GRUP') or None,
+            'created_at': now,
+        })
+    return rows, skipped
+
+@api.route('/purchases/import', methods=['POST'])
+@admin_required
+def import_purchases():
+    """ERP JSON dışa aktarımından alış satırlarını toplu içe aktar.
+    Girdi: 'file' ile JSON dosyası veya gövdede kayıt listesi ({"records": [...]} de olur).
+    Aynı fatura numaralarına ait eski satırlar silinir (tekrar import güvenli), ardından
+    satırlar parça parça tek INSERT ile yazılır ve etkilenen ayların özetleri yenilenir.
+    """
+    import json
+    try:
+        if 'file' in request.files:
+            records = json.load(request.files['file'].stream)
+        else:
+            records = request.get_json(silent=True)
+        if isinstance(records, dict):
+            records = records.get('records') or records.get('data') or []
+        if not isinstance(records, list):
+            return jsonify({'success': False, 'error': 'Kayıt listesi bekleniyor'}), 400
+
+        # Temsilci eşlemesi tek sorguda: kullanıcı adı ve temsilci kodu
+        user_map = {}
+        for uid, username, code in db.session.query(User.id, User.username, User.representative_code).all():
+            if username:
+                user_map[username.lower()] = uid
+            if code:
+                user_map[code.lower()] = uid
+
+        rows, skipped = build_purchase_rows(records, user_map)
+        if not rows:
+            return jsonify({'success': True, 'imported': 0, 'skipped': skipped, 'months': []}), 200
+
+        months = {(r['date'].year, r['date'].month) for r in rows}
+        invoice_nos = sorted({r['invoice_no'] for r in rows if r['invoice_no']})
+        if invoice_nos:
+            old_months = db.session.query(Purchase.date).filter(Purchase.invoice_no.in_(invoice_nos)).distinct().all()
+            months.update((d[0].year, d[0].month) for d in old_months)
+            Purchase.query.filter(Purchase.invoice_no.in_(invoice_nos)).delete(synchronize_session=False)
+
+        for i in range(0, len(rows), PURCHASE_IMPORT_CHUNK):
+            db.session.execute(db.insert(Purchase), rows[i:i + PURCHASE_IMPORT_CHUNK])
+        refresh_purchase_monthly(months)
+        db.session.commit()
+
+        log_activity('purchase_import', f'{len(rows)} alış satırı içe aktarıldı')
+        return jsonify({
+            'success': True,
+            'imported': len(rows),
+            'skipped': skipped,
+            'months': [f"{y}-{str(m).zfill(2)}" for (y, m) in sorted(months)]
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/purchases/summary', methods=['GET'])
+@login_required
+def get_purchases_summary():
+    """Satın alma paneli özeti (PurchaseMonthly üzerinden, ham satır taranmaz).
+    Parametreler: year (varsayılan TR güncel yıl), month (opsiyonel; marka/grup dağılımı o aya daraltılır)
+    """
+    if not (current_user.is_admin() or current_user.has_permission('panel_purchasing', 'view')):
+        return jsonify({'success': False, 'error': 'Satın alma verilerini görüntüleme yetkiniz yok'}), 403
+    try:
+        year = request.args.get('year', type=int) or today_tr().year
+        month = request.args.get('month', type=int)
+        if month is not None and not 1 <= month <= 12:
+            return jsonify({'success': False, 'error': 'Geçersiz ay'}), 400
+
+        monthly_rows = db.session.query(
+            PurchaseMonthly.month,
+            func.sum(PurchaseMonthly.line_count),
+            func.sum(PurchaseMonthly.total_quantity),
+            func.sum(PurchaseMonthly.net_price)
+        ).filter(PurchaseMonthly.year == year).group_by(PurchaseMonthly.month).all()
+        by_month = {r[0]: r for r in monthly_rows}
+        months = [{
+            'month': m,
+            'label': f"{year}-{str(m).zfill(2)}",
+            'line_count': int(by_month[m][1] or 0) if m in by_month else 0,
+            'total_quantity': int(by_month[m][2] or 0) if m in by_month else 0,
+            'net_price': float(by_month[m][3] or 0) if m in by_month else 0.0,
+        } for m in range(1, 13)]
+
+        period_q = PurchaseMonthly.query.filter(PurchaseMonthly.year == year)
+        if month:
+            period_q = period_q.filter(PurchaseMonthly.month == month)
+        brands = period_q.with_entities(
+            PurchaseMonthly.brand, func.sum(PurchaseMonthly.net_price).label('total')
+        ).group_by(PurchaseMonthly.brand).order_by(func.sum(PurchaseMonthly.net_price).desc()).limit(10).all()
+        groups = period_q.with_entities(
+            PurchaseMonthly.product_group, func.sum(PurchaseMonthly.net_price).label('total')
+        ).group_by(PurchaseMonthly.product_group).order_by(func.sum(PurchaseMonthly.net_price).desc()).limit(10).all()
+
+        period_months = [months[month - 1]] if month else months
+        return jsonify({
+            'success': True,
+            'year': year,
+            'month': month,
+            'total_net': sum(m['net_price'] for m in period_months),
+            'total_quantity': sum(m['total_quantity'] for m in period_months),
+            'line_count': sum(m['line_count'] for m in period_months),
+            'months': months,
+            'brands': [{'name': b[0] or 'Bilinmeyen', 'total': float(b[1] or 0)} for b in brands],
+            'product_groups': [{'name': g[0] or 'Bilinmeyen', 'total': float(g[1] or 0)} for g in groups],
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Raporlama
 @api.route('/reports/summary', methods=['GET'])
 @login_required
@@ -1942,36 +2886,102 @@ def test_uyumsoft_connection():
             'error': str(e)
         }), 500
 
+# Uyumsoft önizleme önbelleği: (akış, tarih aralığı) başına dönüştürülmüş veri bir kez
+# UPLOAD_FOLDER altına yazılır; sayfalama ERP'ye tekrar gitmeden bu dosyadan yapılır.
+UYUMSOFT_PREVIEW_MAX_LIMIT = 1000
+
+def get_uyumsoft_client():
+    from uyumsoft_api import UyumsoftAPI
+    from config import Config
+    return UyumsoftAPI(
+        base_url=Config.UYUMSOFT_API_URL,
+        username=Config.UYUMSOFT_USERNAME,
+        password=Config.UYUMSOFT_PASSWORD,
+        company_id=Config.UYUMSOFT_COMPANY_ID
+    )
+
+def load_uyumsoft_preview(stream, start_date, end_date, refresh=False):
+    """Dönüştürülmüş önizleme verisini önbellekten getir, yoksa/eskiyse ERP'den çekip yaz.
+    stream: 'sales' veya 'returns'. Dönüş: (satırlar, önbellek zamanı, önbellekten mi)
+    """
+    import hashlib
+    import json
+    import time
+    cache_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'uyumsoft_cache')
+    key = hashlib.sha1(f"{stream}|{start_date or ''}|{end_date or ''}".encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f"{stream}_{key}.json")
+    ttl = current_app.config.get('UYUMSOFT_PREVIEW_TTL', 600)
+
+    if not refresh:
+        try:
+            mtime = os.path.getmtime(path)
+            if time.time() - mtime < ttl:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    return json.load(fh), datetime.utcfromtimestamp(mtime), True
+        except (OSError, ValueError):
+            pass
+
+    client = get_uyumsoft_client()
+    if stream == 'returns':
+        rows = client.transform_returns_data(client.get_returns_data(start_date, end_date))
+    else:
+        rows = client.transform_sales_data(client.get_sales_data(start_date, end_date))
+
+    # Atomik yazım: yarım dosya başka worker tarafından okunmasın
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(rows, fh, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+    # JSON üzerinden geçmiş hali döndür (önbellekten okunanla aynı tipler)
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh), datetime.utcnow(), False
+
+def uyumsoft_preview_response(stream):
+    """Önizleme isteğini önbellekten sayfalı cevapla.
+    Parametreler: start_date, end_date, offset, limit (en fazla 1000),
+    columns=a,b (alan seçimi), filter=alan:değer (tekrarlanabilir, içerir/büyük-küçük harf duyarsız),
+    refresh=1 (önbelleği yenile)
+    """
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 100, type=int)), UYUMSOFT_PREVIEW_MAX_LIMIT)
+    refresh = request.args.get('refresh', type=int) == 1
+    columns = [c.strip() for c in (request.args.get('columns') or '').split(',') if c.strip()]
+    filters = []
+    for raw in request.args.getlist('filter'):
+        field, sep, value = raw.partition(':')
+        if sep and field.strip():
+            filters.append((field.strip(), value.strip().lower()))
+
+    rows, cached_at, from_cache = load_uyumsoft_preview(stream, start_date, end_date, refresh=refresh)
+    if filters:
+        rows = [r for r in rows if all(value in str(r.get(field, '') or '').lower() for field, value in filters)]
+    total = len(rows)
+    page = rows[offset:offset + limit]
+    if columns:
+        page = [{c: r.get(c) for c in columns} for r in page]
+
+    return jsonify({
+        'success': True,
+        'data': page,
+        'count': total,
+        'offset': offset,
+        'limit': limit,
+        'next_offset': (offset + limit) if offset + limit < total else None,
+        'cached_at': cached_at.isoformat(),
+        'from_cache': from_cache
+    })
+
 @api.route('/uyumsoft/sales', methods=['GET'])
 @admin_required
 def get_uyumsoft_sales():
     """
-    Uyumsoft'tan satış verilerini çek (kaydetmeden)
+    Uyumsoft'tan satış verilerini çek (kaydetmeden) – önbellekli ve sayfalı
     """
     try:
-        from uyumsoft_api import UyumsoftAPI
-        from config import Config
-        
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        uyumsoft_config = {
-            "base_url": Config.UYUMSOFT_API_URL,
-            "username": Config.UYUMSOFT_USERNAME,
-            "password": Config.UYUMSOFT_PASSWORD,
-            "company_id": Config.UYUMSOFT_COMPANY_ID
-        }
-        
-        uyumsoft_api = UyumsoftAPI(**uyumsoft_config)
-        sales_data = uyumsoft_api.get_sales_data(start_date, end_date)
-        transformed_sales = uyumsoft_api.transform_sales_data(sales_data)
-        
-        return jsonify({
-            'success': True,
-            'data': transformed_sales,
-            'count': len(transformed_sales)
-        })
-        
+        return uyumsoft_preview_response('sales')
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1982,37 +2992,15 @@ def get_uyumsoft_sales():
 @admin_required
 def get_uyumsoft_returns():
     """
-    Uyumsoft'tan iade verilerini çek (kaydetmeden)
+    Uyumsoft'tan iade verilerini çek (kaydetmeden) – önbellekli ve sayfalı
     """
     try:
-        from uyumsoft_api import UyumsoftAPI
-        from config import Config
-        
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        uyumsoft_config = {
-            "base_url": Config.UYUMSOFT_API_URL,
-            "username": Config.UYUMSOFT_USERNAME,
-            "password": Config.UYUMSOFT_PASSWORD,
-            "company_id": Config.UYUMSOFT_COMPANY_ID
-        }
-        
-        uyumsoft_api = UyumsoftAPI(**uyumsoft_config)
-        returns_data = uyumsoft_api.get_returns_data(start_date, end_date)
-        transformed_returns = uyumsoft_api.transform_returns_data(returns_data)
-        
-        return jsonify({
-            'success': True,
-            'data': transformed_returns,
-            'count': len(transformed_returns)
-        })
-        
+        return uyumsoft_preview_response('returns')
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500 
+        }), 500
 
 @api.route('/sales/recent', methods=['GET'])
 @login_required
@@ -3005,6 +3993,12 @@ def hard_delete_user(user_id):
                 }), 400
             target_user = User.query.get_or_404(reassign_to)
 
+        # Gün etkinlik indeksi: kullanıcının görevlerindeki diğer kişiler de etkilenir (toplu işlemler ORM olaylarını tetiklemez)
+        activity_user_ids = {user.id, target_user.id if target_user else None}
+        for to_id, creator_id in db.session.query(Task.assigned_to_id, Task.created_by_id).filter(
+                (Task.created_by_id == user.id) | (Task.assigned_by_id == user.id) | (Task.assigned_to_id == user.id)):
+            activity_user_ids.update((to_id, creator_id))
+
         # Devir yapılacaklar veya purge
         if purge:
             # Satış/İade/Hedef ve kullanıcıya bağlı görev/yorumları sil
@@ -3012,11 +4006,20 @@ def hard_delete_user(user_id):
             Returns.query.filter_by(representative_id=user.id).delete(synchronize_session=False)
             Target.query.filter_by(user_id=user.id).delete(synchronize_session=False)
             # Görevler: kullanıcının oluşturduğu ya da atadığı/atanan olduğu tüm görevler silinsin
+            purged_task_ids = db.session.query(Task.id).filter(
+                (Task.created_by_id == user.id) | (Task.assigned_by_id == user.id) | (Task.assigned_to_id == user.id)
+            )
+            purged_ids = [tid for (tid,) in purged_task_ids.all()]
+            TaskOccurrence.query.filter(TaskOccurrence.task_id.in_(purged_task_ids.scalar_subquery())).delete(synchronize_session=False)
             Task.query.filter(
                 (Task.created_by_id == user.id) | (Task.assigned_by_id == user.id) | (Task.assigned_to_id == user.id)
             ).delete(synchronize_session=False)
+            reindex_tasks(purged_ids)
             try:
+                user_comments = db.session.query(TaskComment.id, TaskComment.task_id).filter_by(user_id=user.id).all()
                 TaskComment.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+                recount_task_comments({task_id for _, task_id in user_comments})
+                reindex_comments([comment_id for comment_id, _ in user_comments])
             except Exception:
                 pass
         elif target_user:
@@ -3036,13 +4039,26 @@ def hard_delete_user(user_id):
         # Bildirimler ve görev atamaları
         Notification.query.filter_by(to_user_id=user.id).delete(synchronize_session=False)
         if purge:
+            # Silinen bildirimlerin alıcılarının okunmamış sayaçları yeniden sayılır
+            notified_ids = {uid for (uid,) in db.session.query(Notification.to_user_id).filter_by(created_by_id=user.id).distinct()}
             Notification.query.filter_by(created_by_id=user.id).delete(synchronize_session=False)
+            mark_changed(db.session, notified_ids)
+            recount_unread(notified_ids | {user.id})
         else:
             Notification.query.filter_by(created_by_id=user.id).update({Notification.created_by_id: None})
+            recount_unread([user.id])
         if not purge:
             Task.query.filter_by(assigned_by_id=user.id).update({Task.assigned_by_id: None})
             Task.query.filter_by(assigned_to_id=user.id).update({Task.assigned_to_id: None})
 
+        # Görev tekrar satırları: toplu güncellemeler ORM olaylarını tetiklemez, etkilenen görevleri yeniden hesapla
+        affected_task_ids = [tid for (tid,) in db.session.query(TaskOccurrence.task_id).filter_by(user_id=user.id).distinct()]
+        TaskOccurrence.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        resync_task_occurrences(affected_task_ids)
+        # Arama satırları: silinen planlar ve sahibi değişen görevler
+        reindex_user_documents(user.id)
+        refresh_day_activity(activity_user_ids)
+
         # Departman yöneticiliğini boşalt
         Department.query.filter_by(manager_id=user.id).update({Department.manager_id: None})
 
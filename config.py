@@ -65,6 +65,37 @@ class Config:
     # Dosya yükleme ayarları - Kalıcı depolama için
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', '/opt/render/project/src/uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+
+    # Arka plan dışa aktarım önbelleği (UPLOAD_FOLDER/exports)
+    EXPORT_CACHE_MAX_AGE_HOURS = int(os.environ.get('EXPORT_CACHE_MAX_AGE_HOURS', 24))
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # 200MB
+    EXPORT_JOB_STALE_MINUTES = 30  # bu süreden uzun "running" kalan iş yeniden başlatılabilir
+
+    # Görev tekrar tablosu (task_occurrence) açık uçlu tekrarları bugünden bu kadar gün ileri açar
+    TASK_OCCURRENCE_HORIZON_DAYS = int(os.environ.get('TASK_OCCURRENCE_HORIZON_DAYS', 400))
+    # Bakım işleri (maintenance.py) her worker'da daemon thread olarak çalışır; cron kullanılıyorsa kapatılabilir
+    MAINTENANCE_THREAD_ENABLED = os.environ.get('MAINTENANCE_THREAD_ENABLED', 'true').lower() == 'true'
+
+    # Görev bitiş hatırlatmaları (saatlik bakım işi): bitişe bu kadar gün kala ve gecikmeden sonra bu kadar gün
+    TASK_DUE_SOON_DAYS = int(os.environ.get('TASK_DUE_SOON_DAYS', 3))
+    TASK_OVERDUE_REMINDER_DAYS = int(os.environ.get('TASK_OVERDUE_REMINDER_DAYS', 7))
+
+    # Bildirim alıcı kümeleri (departman yöneticileri, adminler) worker başına bu süre önbellekte tutulur
+    NOTIFICATION_RECIPIENT_CACHE_SECONDS = int(os.environ.get('NOTIFICATION_RECIPIENT_CACHE_SECONDS', 60))
+
+    # Bildirim akışı (SSE): her açık sekme bir worker thread'i tutar (gunicorn gthread ile çalıştırın);
+    # kapatılırsa istemciler yoklamaya döner. Bağlantılar bu süre sonunda yenilenir.
+    NOTIFICATION_STREAM_ENABLED = os.environ.get('NOTIFICATION_STREAM_ENABLED', 'true').lower() == 'true'
+    NOTIFICATION_STREAM_MAX_SECONDS = int(os.environ.get('NOTIFICATION_STREAM_MAX_SECONDS', 300))
+    # Worker başına en fazla bu kadar akış; fazlası 503 alır ve yoklar. --threads değerinden küçük
+    # tutulmalı ki sıradan istekler için thread kalsın (varsayılan: 16 thread'in 12'si)
+    NOTIFICATION_STREAM_MAX_PER_WORKER = int(os.environ.get('NOTIFICATION_STREAM_MAX_PER_WORKER', 12))
+
+    # Plan snapshot geçmişi: bu günden eski günlerde yalnız günün ilk ve son sürümü tutulur (snapshots.py)
+    PLANNING_SNAPSHOT_RETENTION_DAYS = int(os.environ.get('PLANNING_SNAPSHOT_RETENTION_DAYS', 30))
+
+    # BI için aylık bölümlenmiş arşiv (UPLOAD_FOLDER/bi_archive); token ile oturumsuz indirme
+    BI_EXPORT_TOKEN = os.environ.get('BI_EXPORT_TOKEN')
     
     # Renk paleti
     COLORS = {
@@ -86,4 +117,6 @@ class Config:
     
     # Uyumsoft API Timeout Ayarları
     UYUMSOFT_TIMEOUT = 30  # saniye
-    UYUMSOFT_MAX_RETRIES = 3 
\ No newline at end of file
+    UYUMSOFT_MAX_RETRIES = 3
+    # Önizleme (kaydetmeden çekilen veri) yerel önbellek süresi
+    UYUMSOFT_PREVIEW_TTL = int(os.environ.get('UYUMSOFT_PREVIEW_TTL', 600))  # saniye 
\ No newline at end of file
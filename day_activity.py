@@ -0,0 +1,197 @@
+"""Kullanıcı × gün etkinlik indeksi (UserDayActivity).
+
+Ay/yıl takvimleri plan, snapshot, görev başlangıç/bitiş ve tekrar günlerini her istekte
+yeniden hesaplamak yerine bu tablodan tek aralık okumasıyla çizilir. Satırlar kaynaktan
+yeniden hesaplanır (artımlı sayaç tutulmaz, kayma olmaz): ORM flush'ında etkilenen
+kullanıcı/gün aralığı, ORM dışı toplu yazımlarda refresh_* fonksiyonları çağrılır.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, event, func, inspect, or_, select, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+# task_occurrences önce içe aktarılır: flush dinleyicisi tekrar satırları yazıldıktan sonra çalışmalı
+import task_occurrences  # noqa: F401
+from models import db, Planning, PlanningSnapshot, Task, TaskOccurrence, UserDayActivity
+
+INSERT_CHUNK = 1000
+ACTIVITY_COUNT_FIELDS = ('snapshot_count', 'task_start_count', 'task_due_count', 'occurrence_count')
+TASK_ACTIVITY_FIELDS = ('start_date', 'due_date', 'created_at', 'is_recurring', 'recurrence', 'assigned_to_id', 'created_by_id')
+
+
+def date_range_filter(column, start, end):
+    conditions = []
+    if start:
+        conditions.append(column >= start)
+    if end:
+        conditions.append(column <= end)
+    return and_(true(), *conditions)
+
+
+def refresh_day_activity(user_ids, start=None, end=None):
+    """Kullanıcıların [start, end] aralığındaki (None = sınırsız) satırlarını kaynaklardan yeniden yaz.
+    Silip yeniden eklemek yerine upsert edilir: aynı kullanıcı-günü eşzamanlı yenileyen iki işlem
+    unique_user_day_activity kısıtına takılmaz. Aralıkta olup artık etkinliği olmayan satırlar ayrıca silinir.
+    """
+    user_ids = sorted({uid for uid in user_ids if uid})
+    if not user_ids:
+        return
+    connection = db.session.connection()
+    activity = {}
+
+    def row(user_id, day):
+        return activity.setdefault((user_id, day), {'has_plan': False, **{f: 0 for f in ACTIVITY_COUNT_FIELDS}})
+
+    for user_id, day in connection.execute(select(Planning.representative_id, Planning.date).where(
+            Planning.representative_id.in_(user_ids), date_range_filter(Planning.date, start, end))):
+        row(user_id, day)['has_plan'] = True
+    for user_id, day, count in connection.execute(select(
+            PlanningSnapshot.representative_id, PlanningSnapshot.date, func.count(PlanningSnapshot.id)
+    ).where(PlanningSnapshot.representative_id.in_(user_ids), date_range_filter(PlanningSnapshot.date, start, end)
+            ).group_by(PlanningSnapshot.representative_id, PlanningSnapshot.date)):
+        row(user_id, day)['snapshot_count'] = count
+    for user_id, day, count in connection.execute(select(
+            TaskOccurrence.user_id, TaskOccurrence.date, func.count(TaskOccurrence.id)
+    ).where(TaskOccurrence.user_id.in_(user_ids), date_range_filter(TaskOccurrence.date, start, end)
+            ).group_by(TaskOccurrence.user_id, TaskOccurrence.date)):
+        row(user_id, day)['occurrence_count'] = count
+
+    # Başlangıç/bitiş: görev, atanan ve oluşturan için (aynı kişiyse bir kez) sayılır
+    start_dt = datetime.combine(start, datetime.min.time()) if start else None
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    created_filter = and_(true(), *([Task.created_at >= start_dt] if start_dt else []), *([Task.created_at < end_dt] if end_dt else []))
+    tasks = connection.execute(select(
+        Task.assigned_to_id, Task.created_by_id, Task.start_date, Task.created_at, Task.due_date
+    ).where(
+        or_(Task.assigned_to_id.in_(user_ids), Task.created_by_id.in_(user_ids)),
+        or_(and_(Task.start_date.isnot(None), date_range_filter(Task.start_date, start, end)),
+            and_(Task.start_date.is_(None), created_filter),
+            and_(Task.due_date.isnot(None), date_range_filter(Task.due_date, start, end)))
+    ))
+    wanted = set(user_ids)
+    for assigned_to_id, created_by_id, start_date, created_at, due_date in tasks:
+        owners = {assigned_to_id, created_by_id} & wanted
+        start_day = start_date or (created_at.date() if created_at else None)
+        for user_id in owners:
+            if start_day and (not start or start_day >= start) and (not end or start_day <= end):
+                row(user_id, start_day)['task_start_count'] += 1
+            if due_date and (not start or due_date >= start) and (not end or due_date <= end):
+                row(user_id, due_date)['task_due_count'] += 1
+
+    table = UserDayActivity.__table__
+    # Anahtar sırasıyla yazılır: eşzamanlı yenilemeler satır kilitlerini aynı sırada alır
+    rows = [{'user_id': user_id, 'date': day, **values} for (user_id, day), values in sorted(activity.items())]
+    if rows:
+        dialect_insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={name: stmt.excluded[name] for name in ('has_plan',) + ACTIVITY_COUNT_FIELDS},
+        )
+        for i in range(0, len(rows), INSERT_CHUNK):
+            connection.execute(stmt, rows[i:i + INSERT_CHUNK])
+    stale_ids = [row_id for row_id, user_id, day in connection.execute(select(table.c.id, table.c.user_id, table.c.date).where(
+        table.c.user_id.in_(user_ids), date_range_filter(table.c.date, start, end))) if (user_id, day) not in activity]
+    for i in range(0, len(stale_ids), INSERT_CHUNK):
+        connection.execute(delete(table).where(table.c.id.in_(stale_ids[i:i + INSERT_CHUNK])))
+
+
+def merge_span(spans, user_id, start, end):
+    """spans: {user_id: (start, end)}; None sınırsız demektir"""
+    if not user_id:
+        return
+    if user_id not in spans:
+        spans[user_id] = (start, end)
+        return
+    old_start, old_end = spans[user_id]
+    spans[user_id] = (None if old_start is None or start is None else min(old_start, start),
+                      None if old_end is None or end is None else max(old_end, end))
+
+
+def task_activity_spans(spans, values):
+    """Bir görev durumunun (eski veya yeni) etkilediği kullanıcı/gün aralıkları"""
+    created_day = values['created_at'].date() if values.get('created_at') else None
+    days = [d for d in (values.get('start_date'), values.get('due_date'), created_day) if d]
+    recurring = values.get('is_recurring') and (values.get('recurrence') or 'none').lower() not in ('none', '')
+    if not days and not recurring:
+        return
+    start = min(days) if days else None
+    # Tekrarlı görev son tarihe (yoksa ufka) kadar uzanır
+    end = (values.get('due_date') or None) if recurring else max(days)
+    for user_id in (values.get('assigned_to_id'), values.get('created_by_id')):
+        merge_span(spans, user_id, start, end)
+
+
+def refresh_spans(spans):
+    """Aynı aralığa düşen kullanıcıları tek seferde yenile"""
+    by_range = {}
+    for user_id, (start, end) in spans.items():
+        by_range.setdefault((start, end), []).append(user_id)
+    for (start, end), user_ids in by_range.items():
+        refresh_day_activity(user_ids, start, end)
+
+
+def refresh_task_day_activity(task_ids):
+    """ORM dışı yazılan görevler (toplu INSERT) için"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    spans = {}
+    for task in db.session.execute(select(*[getattr(Task, f) for f in TASK_ACTIVITY_FIELDS]).where(Task.id.in_(task_ids))):
+        task_activity_spans(spans, task._asdict())
+    refresh_spans(spans)
+
+
+def refresh_occurrence_keys(rows):
+    """Yeni açılan tekrar satırları ({'user_id', 'date'}) için etkilenen günleri yenile"""
+    spans = {}
+    for r in rows:
+        merge_span(spans, r['user_id'], r['date'], r['date'])
+    refresh_spans(spans)
+
+
+def rebuild_day_activity():
+    """Tabloyu baştan doldur (ilk kurulum / onarım). Yazılan satır sayısını döner."""
+    db.session.execute(delete(UserDayActivity.__table__))
+    user_ids = {uid for (uid,) in db.session.query(Planning.representative_id).distinct()}
+    user_ids.update(uid for (uid,) in db.session.query(PlanningSnapshot.representative_id).distinct())
+    user_ids.update(uid for (uid,) in db.session.query(TaskOccurrence.user_id).distinct())
+    user_ids.update(uid for (uid,) in db.session.query(Task.assigned_to_id).distinct())
+    user_ids.update(uid for (uid,) in db.session.query(Task.created_by_id).distinct())
+    refresh_day_activity(user_ids)
+    return db.session.query(func.count(UserDayActivity.id)).scalar()
+
+
+def old_values(obj, fields):
+    """Flush öncesi değerler (değişmemiş alanlar için mevcut değer)"""
+    state = inspect(obj)
+    values = {}
+    for name in fields:
+        history = state.attrs[name].history
+        values[name] = history.deleted[0] if history.deleted else getattr(obj, name)
+    return values
+
+
+def activity_fields_changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def sync_day_activity_after_flush(session, flush_context):
+    """Plan/snapshot/görev yazımlarında etkilenen kullanıcı-gün aralığını aynı işlemde yeniden hesapla"""
+    spans = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Planning, PlanningSnapshot)):
+            if obj in session.dirty and not activity_fields_changed(obj, ('representative_id', 'date')):
+                continue
+            for values in (old_values(obj, ('representative_id', 'date')), {'representative_id': obj.representative_id, 'date': obj.date}):
+                merge_span(spans, values['representative_id'], values['date'], values['date'])
+        elif isinstance(obj, Task):
+            if obj in session.dirty and not activity_fields_changed(obj, TASK_ACTIVITY_FIELDS):
+                continue
+            task_activity_spans(spans, old_values(obj, TASK_ACTIVITY_FIELDS))
+            task_activity_spans(spans, {name: getattr(obj, name) for name in TASK_ACTIVITY_FIELDS})
+    if spans:
+        refresh_spans(spans)
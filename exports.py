@@ -0,0 +1,487 @@
+"""Excel/CSV dışa aktarım yardımcıları.
+
+Büyük dışa aktarımlar openpyxl'in write_only modunda satır satır yazılır; dosya
+önce bellekte, eşik aşılınca diskte tutulan geçici bir dosyaya kaydedilip istemciye
+akıtılır. Böylece bellek kullanımı satır sayısından bağımsız kalır.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from sqlalchemy import func, or_, union
+
+from models import db, User, Planning, Task, Sales, Returns, Target, ExportJob
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024  # 8MB üstü diske taşar
+STREAM_BATCH_SIZE = 500
+CSV_FLUSH_ROWS = 500
+
+PLANNING_HEADERS = ["Tarih", "Kullanıcı", "Dün Yapılanlar", "Bugün Planı", "Zorluklar", "Oluşturulma Tarihi"]
+TASK_HEADERS = ["Başlık", "Açıklama", "Atanan", "Oluşturan", "Durum", "Öncelik", "Bitiş Tarihi", "Oluşturulma Tarihi"]
+
+
+def new_write_only_workbook():
+    return Workbook(write_only=True)
+
+
+def add_sheet(wb, title, headers, width=20):
+    """write_only çalışma sayfası oluştur, sütun genişliklerini ve stilli başlığı yaz"""
+    ws = wb.create_sheet(title)
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="2D6CDF", end_color="2D6CDF", fill_type="solid")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        row.append(cell)
+    ws.append(row)
+    return ws
+
+
+def save_to_spool(wb):
+    """Çalışma kitabını SpooledTemporaryFile'a kaydet ve başa sar (send_file ile akıtılır)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    wb.save(spool)
+    spool.seek(0)
+    return spool
+
+
+def user_name_map(user_ids):
+    """Verilen kullanıcı id'leri (liste veya alt sorgu) için tek sorguda id -> ad soyad"""
+    rows = db.session.query(User.id, User.first_name, User.last_name).filter(User.id.in_(user_ids)).all()
+    result = {}
+    for uid, first, last in rows:
+        full_name = f"{first or ''} {last or ''}".strip()
+        result[uid] = full_name or "Bilinmeyen Temsilci"
+    return result
+
+
+def planning_tasks_query(user_ids, year):
+    """Kullanıcıların (atanan veya oluşturan) o yıl bitişli ya da o yıl oluşturulmuş görevleri"""
+    year_start, next_year = date(year, 1, 1), date(year + 1, 1, 1)
+    return Task.query.filter(
+        or_(Task.assigned_to_id.in_(user_ids), Task.created_by_id.in_(user_ids)),
+        or_(
+            (Task.due_date >= year_start) & (Task.due_date < next_year),
+            (Task.created_at >= year_start) & (Task.created_at < next_year)
+        )
+    )
+
+
+def write_planning_workbook(wb, user_ids, year):
+    """Planlama arşivi: 'Planlama' ve 'Görevler' sayfalarını yıl filtreli sorgulardan akıtarak yaz"""
+    year_start, next_year = date(year, 1, 1), date(year + 1, 1, 1)
+
+    plans_q = Planning.query.filter(
+        Planning.representative_id.in_(user_ids),
+        Planning.date >= year_start,
+        Planning.date < next_year
+    ).order_by(Planning.date.desc(), Planning.representative_id.asc())
+    tasks_q = planning_tasks_query(user_ids, year).order_by(Task.created_at.asc(), Task.id.asc())
+
+    # İsimler önceden tek sorguda: plan sahipleri + görevlerde geçen tüm kullanıcılar
+    task_user_ids = union(
+        tasks_q.with_entities(Task.assigned_to_id).order_by(None),
+        tasks_q.with_entities(Task.created_by_id).order_by(None)
+    )
+    names = user_name_map(list(user_ids))
+    names.update(user_name_map(db.select(task_user_ids.subquery().c[0])))
+
+    ws_planning = add_sheet(wb, "Planlama", PLANNING_HEADERS)
+    for plan in plans_q.yield_per(STREAM_BATCH_SIZE):
+        ws_planning.append([
+            plan.date.strftime('%d.%m.%Y'),
+            names.get(plan.representative_id, 'Bilinmeyen'),
+            plan.yesterday_activities or '',
+            plan.today_plan or '',
+            plan.challenges or '',
+            plan.created_at.strftime('%d.%m.%Y %H:%M') if plan.created_at else ''
+        ])
+
+    ws_tasks = add_sheet(wb, "Görevler", TASK_HEADERS)
+    for task in tasks_q.yield_per(STREAM_BATCH_SIZE):
+        ws_tasks.append([
+            task.title or '',
+            task.description or '',
+            names.get(task.assigned_to_id, 'Atanmamış') if task.assigned_to_id else 'Atanmamış',
+            names.get(task.created_by_id, 'Bilinmeyen'),
+            task.status or '',
+            task.priority or '',
+            task.due_date.strftime('%d.%m.%Y') if task.due_date else '',
+            task.created_at.strftime('%d.%m.%Y %H:%M') if task.created_at else ''
+        ])
+    return wb
+
+
+# Satış / iade ham satır dışa aktarımı
+FACT_EXPORT_MODELS = {'sales': (Sales, 'Satışlar'), 'returns': (Returns, 'İadeler')}
+FACT_EXPORT_HEADERS = ["Tarih", "Temsilci", "Temsilci Kodu", "Müşteri Kodu", "Müşteri", "Ürün Grubu",
+                       "Marka", "Ürün", "Adet", "Birim Fiyat", "Toplam Fiyat", "Net Fiyat"]
+
+
+def fact_export_headers(model):
+    return FACT_EXPORT_HEADERS + (["İade Nedeni"] if model is Returns else [])
+
+
+def fact_export_statement(model, user_ids=None, start_date=None, end_date=None):
+    """Sales/Returns satırlarını temsilci adlarıyla birlikte (tek JOIN) seçen sorgu.
+    user_ids None ise kapsam kısıtı yoktur (admin).
+    """
+    columns = [
+        model.date, User.first_name, User.last_name, User.representative_code,
+        model.customer_code, model.customer_name, model.product_group, model.brand,
+        model.product_name, model.quantity, model.unit_price, model.total_price, model.net_price
+    ]
+    if model is Returns:
+        columns.append(model.return_reason)
+    if isinstance(start_date, str):
+        start_date = date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = date.fromisoformat(end_date)
+    stmt = db.select(*columns).outerjoin(User, User.id == model.representative_id)
+    if user_ids is not None:
+        stmt = stmt.where(model.representative_id.in_(user_ids))
+    if start_date:
+        stmt = stmt.where(model.date >= start_date)
+    if end_date:
+        stmt = stmt.where(model.date <= end_date)
+    return stmt.order_by(model.date.asc(), model.id.asc())
+
+
+def iter_fact_rows(stmt):
+    """Sunucu tarafı imleçle (stream_results) satır satır oku; bellekte en fazla bir parti tutulur"""
+    result = db.session.execute(stmt, execution_options={'stream_results': True, 'yield_per': STREAM_BATCH_SIZE})
+    for row in result:
+        values = list(row)
+        full_name = f"{values[1] or ''} {values[2] or ''}".strip()
+        yield [values[0].isoformat() if values[0] else '', full_name or 'Bilinmeyen Temsilci'] + [
+            '' if v is None else v for v in values[3:]
+        ]
+
+
+def iter_csv(headers, rows):
+    """CSV çıktısını parça parça üret (Excel'in Türkçe karakterleri tanıması için BOM ile)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_rows_workbook(wb, title, headers, rows):
+    """Tek sayfalık write_only çalışma kitabına satırları akıt"""
+    ws = add_sheet(wb, title, headers, width=18)
+    for row in rows:
+        ws.append(row)
+    return wb
+
+
+# Arka plan dışa aktarım işleri
+# Anahtar = (rapor tipi, kapsam, parametreler, veri sürümü). Veri değişmedikçe aynı istek
+# mevcut dosyadan anında servis edilir; eski dosyalar yaş/boyut bütçesine göre silinir.
+def export_dir(app):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'exports')
+
+
+def export_data_version(report_type, scope, params):
+    """Kapsam ve parametrelere giren verinin ucuz bir özeti (sayı, id toplamı/en büyüğü, son düzenleme)"""
+    if report_type in FACT_EXPORT_MODELS:
+        model = FACT_EXPORT_MODELS[report_type][0]
+        # updated_at her düzenlemede yenilenir: hangi sütun değişirse değişsin sürüm değişir
+        q = db.session.query(func.count(model.id), func.max(model.id), func.sum(model.id),
+                             func.max(func.coalesce(model.updated_at, model.created_at)))
+        if scope is not None:
+            q = q.filter(model.representative_id.in_(scope))
+        if params.get('start_date'):
+            q = q.filter(model.date >= date.fromisoformat(params['start_date']))
+        if params.get('end_date'):
+            q = q.filter(model.date <= date.fromisoformat(params['end_date']))
+        return '|'.join(str(v) for v in q.one())
+    if report_type == 'planning':
+        year = params['year']
+        plans = db.session.query(func.count(Planning.id), func.max(Planning.updated_at)).filter(
+            Planning.representative_id.in_(scope),
+            Planning.date >= date(year, 1, 1),
+            Planning.date < date(year + 1, 1, 1)
+        ).one()
+        tasks = planning_tasks_query(scope, year).with_entities(func.count(Task.id), func.max(Task.updated_at)).one()
+        return '|'.join(str(v) for v in (*plans, *tasks))
+    raise ValueError('Geçersiz rapor tipi')
+
+
+def export_cache_key(report_type, scope, params, version):
+    payload = json.dumps({'type': report_type, 'scope': scope, 'params': params, 'version': version},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def generate_export_file(report_type, scope, params, path):
+    """Raporu doğrudan diske yaz (CSV parça parça, XLSX write_only)"""
+    if report_type in FACT_EXPORT_MODELS:
+        model, sheet_title = FACT_EXPORT_MODELS[report_type]
+        stmt = fact_export_statement(model, scope, params.get('start_date'), params.get('end_date'))
+        headers = fact_export_headers(model)
+        if params.get('format') == 'csv':
+            with open(path, 'wb') as fh:
+                for chunk in iter_csv(headers, iter_fact_rows(stmt)):
+                    fh.write(chunk)
+            return
+        write_rows_workbook(new_write_only_workbook(), sheet_title, headers, iter_fact_rows(stmt)).save(path)
+        return
+    if report_type == 'planning':
+        write_planning_workbook(new_write_only_workbook(), scope, params['year']).save(path)
+        return
+    raise ValueError('Geçersiz rapor tipi')
+
+
+def unique_tmp_path(path):
+    """Eşzamanlı yazarlar (thread/worker) aynı geçici dosyayı paylaşmasın"""
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+def run_export_job(app, job_id):
+    """İşi çalıştır: geçici dosyaya üret, tamamlanınca atomik olarak yerine taşı"""
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    target_dir = export_dir(app)
+    os.makedirs(target_dir, exist_ok=True)
+    path = os.path.join(target_dir, job.file_name)
+    # Aynı anahtar için iki iş aynı anda üretebilir: her iş kendi geçici dosyasına yazar, son os.replace kazanır
+    tmp_path = f"{path}.{job.id}.tmp"
+    try:
+        generate_export_file(job.report_type, json.loads(job.scope) if job.scope else None,
+                             json.loads(job.params or '{}'), tmp_path)
+        os.replace(tmp_path, path)
+        job.status = 'ready'
+        job.file_size = os.path.getsize(path)
+        job.error = None
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def start_export_job(app, job_id):
+    """İşi ayrı bir thread'de başlat (gunicorn istek zaman aşımına takılmaz)"""
+    def target():
+        with app.app_context():
+            run_export_job(app, job_id)
+    thread = threading.Thread(target=target, name=f'export-job-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def export_job_file_path(app, job):
+    return os.path.join(export_dir(app), job.file_name) if job.file_name else None
+
+
+def gc_export_files(app):
+    """Yaş ve toplam boyut bütçesini aşan dışa aktarım dosyalarını ve kayıtlarını sil"""
+    max_age = timedelta(hours=app.config.get('EXPORT_CACHE_MAX_AGE_HOURS', 24))
+    max_bytes = app.config.get('EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+    stale_running = timedelta(minutes=app.config.get('EXPORT_JOB_STALE_MINUTES', 30))
+    now = datetime.utcnow()
+
+    removed = 0
+    kept_bytes = 0
+    jobs = ExportJob.query.order_by(ExportJob.last_accessed_at.desc()).all()
+    kept_files = set()
+    removed_files = set()
+    for job in jobs:
+        if job.status in ('pending', 'running'):
+            # Hiç başlamamış (thread ölmüş / worker kapanmış) iş oluşturulma zamanından zaman aşımına uğrar
+            since = job.started_at or job.created_at
+            if since and now - since > stale_running:
+                job.status = 'failed'
+                job.error = 'Zaman aşımı'
+            kept_files.add(job.file_name)
+            continue
+        # Başarısız işler de yaşlanana kadar tutulur: durumu yoklayan istemci hata mesajını görebilmeli
+        expired = job.last_accessed_at is None or now - job.last_accessed_at > max_age
+        over_budget = job.status == 'ready' and kept_bytes + (job.file_size or 0) > max_bytes
+        if expired or over_budget:
+            removed_files.add(job.file_name)
+            db.session.delete(job)
+            removed += 1
+            continue
+        kept_files.add(job.file_name)
+        kept_bytes += job.file_size or 0
+    db.session.commit()
+    # Aynı anahtarlı iki iş aynı dosyayı paylaşabilir: dosya, onu kullanan kayıt kalmadıysa silinir
+    for file_name in removed_files - kept_files:
+        path = os.path.join(export_dir(app), file_name) if file_name else None
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return removed
+
+
+# BI arşivi: tablo başına ay ay gzip'li CSV bölümleri + manifest.json
+# Her bölümün veri sürümü gruplu tek sorguyla hesaplanır; yalnızca sürümü değişen bölümler yeniden yazılır.
+BI_ARCHIVE_TABLES = {
+    'sales': (Sales, Sales.date, ['id', 'date', 'representative_id', 'customer_code', 'customer_name', 'product_group',
+                                  'brand', 'product_name', 'quantity', 'unit_price', 'total_price', 'net_price', 'created_at']),
+    'returns': (Returns, Returns.date, ['id', 'date', 'representative_id', 'customer_code', 'customer_name', 'product_group',
+                                        'brand', 'product_name', 'quantity', 'unit_price', 'total_price', 'net_price',
+                                        'return_reason', 'created_at']),
+    'targets': (Target, None, ['id', 'user_id', 'year', 'month', 'target_amount', 'created_at', 'updated_at']),
+}
+BI_MANIFEST_NAME = 'manifest.json'
+
+
+def bi_archive_dir(app):
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'bi_archive')
+
+
+def bi_partition_versions(table):
+    """{(yıl, ay): veri sürümü} – satır sayısı, id toplamı/en büyüğü ve son düzenleme zamanından özet.
+    updated_at her düzenlemede yenilendiği için hangi sütun değişirse değişsin bölüm yeniden yazılır.
+    """
+    model, date_column, _ = BI_ARCHIVE_TABLES[table]
+    if date_column is None:
+        year_col, month_col = model.year, model.month
+    else:
+        year_col, month_col = func.extract('year', date_column), func.extract('month', date_column)
+    fingerprint = [func.count(model.id), func.max(model.id), func.sum(model.id),
+                   func.max(func.coalesce(model.updated_at, model.created_at))]
+    rows = db.session.query(year_col, month_col, *fingerprint).group_by(year_col, month_col).all()
+    return {(int(r[0]), int(r[1])): '|'.join(str(v) for v in r[2:]) for r in rows}
+
+
+def bi_partition_rows(table, year, month):
+    model, date_column, columns = BI_ARCHIVE_TABLES[table]
+    stmt = db.select(*[getattr(model, c) for c in columns])
+    if date_column is None:
+        stmt = stmt.where(model.year == year, model.month == month)
+    else:
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        stmt = stmt.where(date_column >= start, date_column < end)
+    stmt = stmt.order_by(model.id).execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+    for row in db.session.execute(stmt):
+        yield [v.isoformat() if isinstance(v, (date, datetime)) else v for v in row]
+
+
+def write_bi_partition(table, year, month, path):
+    """Bölümü gzip'li CSV olarak yaz; mtime=0 ile aynı veri aynı sağlama toplamını verir"""
+    columns = BI_ARCHIVE_TABLES[table][2]
+    tmp_path = unique_tmp_path(path)
+    row_count = 0
+    try:
+        with open(tmp_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as gz, \
+                io.TextIOWrapper(gz, encoding='utf-8', newline='') as text:
+            writer = csv.writer(text)
+            writer.writerow(columns)
+            for row in bi_partition_rows(table, year, month):
+                writer.writerow(row)
+                row_count += 1
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return row_count, digest.hexdigest()
+
+
+def load_bi_manifest(app):
+    path = os.path.join(bi_archive_dir(app), BI_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'tables': {}}
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def refresh_bi_archive(app, tables=None, force=False):
+    """Değişen bölümleri yeniden yaz, silinen ayları kaldır, manifest'i atomik olarak güncelle.
+    Dönüş: {'written': [...], 'removed': [...], 'unchanged': n}
+    """
+    base = bi_archive_dir(app)
+    manifest = load_bi_manifest(app)
+    summary = {'written': [], 'removed': [], 'unchanged': 0}
+
+    for table in (tables or BI_ARCHIVE_TABLES.keys()):
+        os.makedirs(os.path.join(base, table), exist_ok=True)
+        previous = manifest['tables'].get(table, {})
+        current = {}
+        for (year, month), version in sorted(bi_partition_versions(table).items()):
+            key = f'{year:04d}-{month:02d}'
+            rel_path = f'{table}/{key}.csv.gz'
+            entry = previous.get(key)
+            if not force and entry and entry.get('data_version') == version \
+                    and os.path.exists(os.path.join(base, rel_path)):
+                current[key] = entry
+                summary['unchanged'] += 1
+                continue
+            rows, sha256 = write_bi_partition(table, year, month, os.path.join(base, rel_path))
+            current[key] = {
+                'file': rel_path,
+                'rows': rows,
+                'bytes': os.path.getsize(os.path.join(base, rel_path)),
+                'sha256': sha256,
+                'data_version': version,
+                'written_at': datetime.utcnow().isoformat()
+            }
+            summary['written'].append(rel_path)
+        for key in set(previous) - set(current):
+            try:
+                os.remove(os.path.join(base, previous[key]['file']))
+            except OSError:
+                pass
+            summary['removed'].append(previous[key]['file'])
+        manifest['tables'][table] = current
+        manifest.setdefault('columns', {})[table] = BI_ARCHIVE_TABLES[table][2]
+
+    manifest['format'] = 'csv.gz'
+    manifest['generated_at'] = datetime.utcnow().isoformat()
+    manifest_path = os.path.join(base, BI_MANIFEST_NAME)
+    tmp_path = unique_tmp_path(manifest_path)
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return summary
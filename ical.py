@@ -0,0 +1,155 @@
+"""Görev ve günlük planlar için iCalendar (RFC 5545) akışı.
+
+Takvim istemcileri akışı sık sorgular. Kullanıcının görev/plan sürümü (sayı + son güncelleme)
+ucuz bir sorguyla hesaplanır; ETag buna dayanır. Değişiklik yoksa (If-None-Match) istek 304 ile
+biter, sunucu tarafında da üretilmiş metin sürüm anahtarıyla bellekte tutulur. Last-Modified
+bilgi amaçlıdır: silme sonrası geriye gidebildiği için If-Modified-Since ile 304 verilmez.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from threading import Lock
+from urllib.parse import urlsplit
+
+from sqlalchemy import func
+
+from models import db, Task, Planning
+
+PLAN_FEED_DAYS = 180
+FEED_CACHE_SIZE = 256
+RRULE_FREQ = {'daily': 'DAILY', 'weekly': 'WEEKLY', 'monthly': 'MONTHLY', 'yearly': 'YEARLY'}
+
+_feed_cache = OrderedDict()
+_feed_cache_lock = Lock()
+
+
+def feed_version(user_id, today):
+    """(etag, last_modified UTC) – kullanıcının görev ve plan kümesinin özeti"""
+    task_count, task_updated = db.session.query(func.count(Task.id), func.max(Task.updated_at)).filter(
+        (Task.assigned_to_id == user_id) | (Task.created_by_id == user_id)
+    ).one()
+    plan_count, plan_updated = db.session.query(func.count(Planning.id), func.max(Planning.updated_at)).filter(
+        Planning.representative_id == user_id,
+        Planning.date >= today - timedelta(days=PLAN_FEED_DAYS)
+    ).one()
+    stamps = [d for d in (task_updated, plan_updated) if d]
+    last_modified = (max(stamps) if stamps else datetime(2000, 1, 1)).replace(microsecond=0, tzinfo=timezone.utc)
+    raw = f"{user_id}|{today}|{task_count}|{task_updated}|{plan_count}|{plan_updated}"
+    return hashlib.sha1(raw.encode()).hexdigest(), last_modified
+
+
+def escape_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold_line(line):
+    """75 oktet sınırında satır katlama (çok baytlı karakterleri bölmeden)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size = [], '', 0
+    for ch in line:
+        ch_size = len(ch.encode('utf-8'))
+        if size + ch_size > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += ch
+        size += ch_size
+    parts.append(current)
+    return '\r\n '.join(parts)
+
+
+def ics_date(d):
+    return d.strftime('%Y%m%d')
+
+
+def task_event_lines(task, base_url, stamp):
+    from task_occurrences import recurrence_pattern, task_anchor
+    pattern = recurrence_pattern(task)
+    host = urlsplit(base_url).hostname
+    lines = ['BEGIN:VEVENT', f'UID:task-{task.id}@{host}', f'DTSTAMP:{stamp}']
+    if pattern:
+        anchor = task_anchor(task)
+        if not anchor or pattern not in RRULE_FREQ:
+            return []
+        lines.append(f'DTSTART;VALUE=DATE:{ics_date(anchor)}')
+        rule = f'FREQ={RRULE_FREQ[pattern]}'
+        if task.due_date:
+            rule += f';UNTIL={ics_date(task.due_date)}'
+        lines.append(f'RRULE:{rule}')
+    else:
+        start = task.start_date or task.due_date
+        if not start:
+            return []
+        end = task.due_date if task.due_date and task.due_date >= start else start
+        lines.append(f'DTSTART;VALUE=DATE:{ics_date(start)}')
+        lines.append(f'DTEND;VALUE=DATE:{ics_date(end + timedelta(days=1))}')
+    lines.append(f'SUMMARY:{escape_text(task.title)}')
+    if task.description:
+        lines.append(f'DESCRIPTION:{escape_text(task.description)}')
+    lines.append(f"STATUS:{'CANCELLED' if task.status == 'cancelled' else ('COMPLETED' if task.status == 'completed' else 'CONFIRMED')}")
+    lines.append(f'URL:{base_url}/tasks')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def plan_event_lines(plan, base_url, stamp):
+    description = '\n\n'.join(part for part in (
+        plan.today_plan,
+        f'Dün: {plan.yesterday_activities}' if plan.yesterday_activities else None,
+        f'Zorluklar: {plan.challenges}' if plan.challenges else None,
+    ) if part)
+    return [
+        'BEGIN:VEVENT',
+        f'UID:plan-{plan.id}@{urlsplit(base_url).hostname}',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART;VALUE=DATE:{ics_date(plan.date)}',
+        f'DTEND;VALUE=DATE:{ics_date(plan.date + timedelta(days=1))}',
+        'SUMMARY:Günlük Plan',
+        f'DESCRIPTION:{escape_text(description)}',
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+
+
+def render_feed(user, base_url, today):
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//SalesDashboard//Planlama//TR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(user.get_full_name())} - Görevler ve Planlar',
+        'X-WR-TIMEZONE:Europe/Istanbul',
+        'X-PUBLISHED-TTL:PT15M',
+    ]
+    tasks = Task.query.filter(
+        (Task.assigned_to_id == user.id) | (Task.created_by_id == user.id)
+    ).order_by(Task.id.asc()).all()
+    for task in tasks:
+        lines.extend(task_event_lines(task, base_url, stamp))
+    plans = Planning.query.filter(
+        Planning.representative_id == user.id,
+        Planning.date >= today - timedelta(days=PLAN_FEED_DAYS)
+    ).order_by(Planning.date.asc()).all()
+    for plan in plans:
+        lines.extend(plan_event_lines(plan, base_url, stamp))
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold_line(line) for line in lines) + '\r\n'
+
+
+def cached_feed(user, base_url, today, etag):
+    """Aynı sürüm için üretilmiş metni tekrar kullan"""
+    key = (user.id, base_url, etag)
+    with _feed_cache_lock:
+        body = _feed_cache.get(key)
+        if body is not None:
+            _feed_cache.move_to_end(key)
+            return body
+    body = render_feed(user, base_url, today)
+    with _feed_cache_lock:
+        _feed_cache[key] = body
+        while len(_feed_cache) > FEED_CACHE_SIZE:
+            _feed_cache.popitem(last=False)
+    return body
@@ -1,8 +1,9 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, UserRole, Department, DepartmentPermission
+from models import db, User, UserRole, Department, DepartmentPermission, Task, TaskOccurrence
 from auth import auth
 from api import api
+from maintenance import init_maintenance
 from config import Config
 from sqlalchemy import text
 import os
@@ -174,6 +175,123 @@ def create_app():
             except Exception as e:
                 db.session.rollback()
                 print(f"[MIGRATION] Teknik Dizel oluşturma/izin hatası: {e}")
+
+            # task.due_date indeksi (hatırlatma işi bu indeksi tarar); create_all mevcut tabloya eklemez
+            try:
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_task_due_date ON task (due_date)"))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] task.due_date indeks hatası: {e}")
+
+            # sales/returns.updated_at (dışa aktarım veri sürümü); mevcut satırlar created_at ile doldurulur
+            for table_name in ('sales', 'returns'):
+                try:
+                    if db.engine.dialect.name == 'postgresql':
+                        has_column = db.session.execute(text(
+                            "SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = 'updated_at'"
+                        ), {'table': table_name}).scalar()
+                        column_type = 'TIMESTAMP'
+                    else:
+                        has_column = 'updated_at' in [row[1] for row in db.session.execute(text(f"PRAGMA table_info('{table_name}')")).fetchall()]
+                        column_type = 'DATETIME'
+                    if not has_column:
+                        db.session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN updated_at {column_type}"))
+                        db.session.execute(text(f"UPDATE {table_name} SET updated_at = created_at"))
+                        print(f"[MIGRATION] {table_name}.updated_at sütunu eklendi")
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[MIGRATION] {table_name}.updated_at hatası: {e}")
+
+            # task.comment_count sütunu (listelerde yorum sayısı); ilk eklendiğinde mevcut yorumlardan doldurulur
+            try:
+                if db.engine.dialect.name == 'postgresql':
+                    has_column = db.session.execute(text(
+                        "SELECT 1 FROM information_schema.columns WHERE table_name = 'task' AND column_name = 'comment_count'"
+                    )).scalar()
+                else:
+                    has_column = 'comment_count' in [row[1] for row in db.session.execute(text("PRAGMA table_info('task')")).fetchall()]
+                if not has_column:
+                    db.session.execute(text("ALTER TABLE task ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0"))
+                    db.session.execute(text(
+                        "UPDATE task SET comment_count = (SELECT COUNT(*) FROM task_comment WHERE task_comment.task_id = task.id)"
+                    ))
+                    print("[MIGRATION] task.comment_count sütunu eklendi")
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_task_comment_task_id_id ON task_comment (task_id, id)"))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] task.comment_count hatası: {e}")
+
+            # planning_snapshot fark (delta) sütunları; mevcut satırlar tam metin olarak kalır
+            try:
+                if db.engine.dialect.name == 'postgresql':
+                    snapshot_columns = {row[0] for row in db.session.execute(text(
+                        "SELECT column_name FROM information_schema.columns WHERE table_name = 'planning_snapshot'"
+                    )).fetchall()}
+                    delta_type, false_value = 'BYTEA', 'false'
+                else:
+                    snapshot_columns = {row[1] for row in db.session.execute(text("PRAGMA table_info('planning_snapshot')")).fetchall()}
+                    delta_type, false_value = 'BLOB', '0'
+                if 'is_delta' not in snapshot_columns:
+                    db.session.execute(text(f"ALTER TABLE planning_snapshot ADD COLUMN is_delta BOOLEAN NOT NULL DEFAULT {false_value}"))
+                    print("[MIGRATION] planning_snapshot.is_delta sütunu eklendi")
+                if 'delta' not in snapshot_columns:
+                    db.session.execute(text(f"ALTER TABLE planning_snapshot ADD COLUMN delta {delta_type}"))
+                    print("[MIGRATION] planning_snapshot.delta sütunu eklendi")
+                db.session.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_planning_snapshot_rep_date ON planning_snapshot (representative_id, date)"
+                ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] planning_snapshot delta sütunları hatası: {e}")
+
+            # Görev tekrar tablosu boşsa mevcut görevlerden doldur
+            try:
+                from task_occurrences import rebuild_task_occurrences
+                if Task.query.first() and not TaskOccurrence.query.first():
+                    rows = rebuild_task_occurrences()
+                    db.session.commit()
+                    print(f"[MIGRATION] task_occurrence tablosu dolduruldu: {rows} satır")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] task_occurrence doldurma hatası: {e}")
+
+            # Gün etkinlik indeksi boşsa plan/görev kayıtlarından doldur (tekrar satırları hazır olmalı)
+            try:
+                from day_activity import rebuild_day_activity
+                from models import Planning, UserDayActivity
+                if not UserDayActivity.query.first() and (Planning.query.first() or Task.query.first()):
+                    rows = rebuild_day_activity()
+                    db.session.commit()
+                    print(f"[MIGRATION] user_day_activity tablosu dolduruldu: {rows} satır")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] user_day_activity doldurma hatası: {e}")
+
+            # Okunmamış bildirim sayaçları boşsa mevcut bildirimlerden doldur
+            try:
+                from notifications import recount_unread
+                from models import Notification, NotificationCounter
+                if not NotificationCounter.query.first() and Notification.query.filter_by(is_read=False).first():
+                    rows = recount_unread()
+                    db.session.commit()
+                    print(f"[MIGRATION] notification_counter tablosu dolduruldu: {rows} satır")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] notification_counter doldurma hatası: {e}")
+
+            # Tam metin arama indeksi (SQLite FTS5 / PostgreSQL tsvector + GIN); boşsa mevcut kayıtlardan doldur
+            try:
+                from search import ensure_search_index
+                rows = ensure_search_index()
+                if rows:
+                    print(f"[MIGRATION] search_document tablosu dolduruldu: {rows} satır")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[MIGRATION] arama indeksi hatası: {e}")
         except Exception as e:
             print(f"[MIGRATION] create_all hatası: {e}")
     
@@ -206,6 +324,9 @@ def create_app():
     # Blueprint'leri kaydet
     app.register_blueprint(auth, url_prefix='/auth')
     app.register_blueprint(api, url_prefix='/api')
+
+    # Periyodik bakım işleri (CLI + arka plan thread'i)
+    init_maintenance(app)
     
     # Ana sayfa
     @app.route('/')
@@ -0,0 +1,131 @@
+"""Periyodik bakım işleri.
+
+İşler hem `flask maintenance run` CLI komutuyla (ör. Render cron) hem de her worker'da
+çalışan hafif bir daemon thread ile tetiklenebilir. İşler idempotent yazılmalıdır; birden
+fazla worker aynı işi çalıştırsa da sonuç değişmez.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+
+from models import db
+from notifications import recount_unread
+from reminders import generate_due_reminders, prune_task_reminders
+from search import rebuild_search_documents
+from snapshots import coalesce_old_snapshots
+from day_activity import rebuild_day_activity
+from exports import refresh_bi_archive
+from task_occurrences import extend_task_occurrences, rebuild_task_occurrences
+
+MAINTENANCE_TICK_SECONDS = 60
+# (iş adı, çalışma aralığı (dakika), fonksiyon)
+MAINTENANCE_JOBS = []
+_last_runs = {}
+
+
+def maintenance_job(name, interval_minutes):
+    def decorator(fn):
+        MAINTENANCE_JOBS.append((name, interval_minutes, fn))
+        return fn
+    return decorator
+
+
+@maintenance_job('task_occurrences', 24 * 60)
+def extend_task_occurrences_job(app):
+    """Açık uçlu tekrarlı görevleri kayan ufka kadar aç"""
+    added = extend_task_occurrences()
+    db.session.commit()
+    return added
+
+
+@maintenance_job('task_reminders', 60)
+def task_reminders_job(app):
+    """Bitişi yaklaşan ve geciken görevler için günlük tekil bildirimler"""
+    created = generate_due_reminders()
+    prune_task_reminders()
+    return created
+
+
+@maintenance_job('planning_snapshots', 24 * 60)
+def planning_snapshots_job(app):
+    """Saklama süresini geçen günlerde ara plan sürümlerini birleştir"""
+    return coalesce_old_snapshots()
+
+
+@maintenance_job('notification_counters', 60)
+def notification_counters_job(app):
+    """Okunmamış bildirim sayaçlarını kaynaktan yeniden say (kaymaları onarır)"""
+    rows = recount_unread()
+    db.session.commit()
+    return rows
+
+
+@maintenance_job('bi_archive', 24 * 60)
+def bi_archive_job(app):
+    """BI arşivinin gecelik artımlı yenilenmesi: yalnızca veri sürümü değişen aylar yeniden yazılır"""
+    summary = refresh_bi_archive(app)
+    return f"{len(summary['written'])} yazıldı, {len(summary['removed'])} silindi, {summary['unchanged']} değişmedi"
+
+
+def run_maintenance_jobs(app, names=None, force=False):
+    """Vakti gelen (veya force ile istenen) işleri çalıştır. {iş adı: sonuç} döner."""
+    results = {}
+    now = datetime.utcnow()
+    for name, interval_minutes, fn in MAINTENANCE_JOBS:
+        if names and name not in names:
+            continue
+        last = _last_runs.get(name)
+        if not force and last and now - last < timedelta(minutes=interval_minutes):
+            continue
+        try:
+            results[name] = fn(app)
+        except Exception as e:
+            db.session.rollback()
+            results[name] = f'hata: {e}'
+            print(f"[MAINTENANCE] {name} hatası: {e}")
+        _last_runs[name] = now
+    return results
+
+
+def maintenance_loop(app):
+    while True:
+        time.sleep(MAINTENANCE_TICK_SECONDS)
+        with app.app_context():
+            run_maintenance_jobs(app)
+            db.session.remove()
+
+
+def init_maintenance(app):
+    """CLI komutlarını kaydet ve (açıksa) arka plan thread'ini başlat"""
+    @app.cli.group('maintenance')
+    def maintenance_cli():
+        """Bakım işleri"""
+
+    @maintenance_cli.command('run')
+    @click.option('--job', 'jobs', multiple=True, help='Sadece belirtilen iş(ler)i çalıştır')
+    def run_command(jobs):
+        for name, result in run_maintenance_jobs(app, names=jobs or None, force=True).items():
+            click.echo(f'{name}: {result}')
+
+    @maintenance_cli.command('rebuild-occurrences')
+    def rebuild_occurrences_command():
+        rows = rebuild_task_occurrences()
+        db.session.commit()
+        click.echo(f'task_occurrence: {rows} satır yazıldı')
+
+    @maintenance_cli.command('rebuild-day-activity')
+    def rebuild_day_activity_command():
+        rows = rebuild_day_activity()
+        db.session.commit()
+        click.echo(f'user_day_activity: {rows} satır yazıldı')
+
+    @maintenance_cli.command('rebuild-search')
+    def rebuild_search_command():
+        rows = rebuild_search_documents()
+        click.echo(f'search_document: {rows} satır yazıldı')
+
+    if app.config.get('MAINTENANCE_THREAD_ENABLED'):
+        thread = threading.Thread(target=maintenance_loop, args=(app,), name='maintenance', daemon=True)
+        thread.start()
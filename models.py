@@ -184,12 +184,22 @@ class Planning(db.Model):
         return datetime.utcnow() - self.created_at < timedelta(hours=24)
 
 class PlanningSnapshot(db.Model):
+    """Günlük planın kayıt geçmişi.
+    Günün ilk sürümü (ve belirli aralıklarla bir sürüm) tam metin saklar; diğerleri bir önceki
+    sürüme göre sıkıştırılmış fark (delta) tutar. Tam sürümler snapshots.py ile yeniden kurulur.
+    """
+    __table_args__ = (
+        db.Index('ix_planning_snapshot_rep_date', 'representative_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     representative_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     yesterday_activities = db.Column(db.Text, nullable=True)
     today_plan = db.Column(db.Text, nullable=True)
     challenges = db.Column(db.Text, nullable=True)
+    is_delta = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    delta = db.Column(db.LargeBinary, nullable=True)  # zlib(JSON) alan farkları; is_delta ise dolu
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     representative = db.relationship('User')
@@ -223,6 +233,8 @@ class Sales(db.Model):
     original_date = db.Column(db.String(20), nullable=True)      # TARIH alanından
     original_product_group = db.Column(db.String(100), nullable=True)  # URUN_ANA_GRUP alanından
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Dışa aktarım önbelleği ve BI arşivi veri sürümü için: her düzenlemede yenilenir
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # İlişki çakışmasını önlemek için kaldırıldı
     # representative = db.relationship('User', backref='sales')
@@ -246,10 +258,50 @@ class Returns(db.Model):
     original_date = db.Column(db.String(20), nullable=True)      # TARIH alanından
     original_product_group = db.Column(db.String(100), nullable=True)  # URUN_ANA_GRUP alanından
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Dışa aktarım önbelleği ve BI arşivi veri sürümü için: her düzenlemede yenilenir
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # İlişki çakışmasını önlemek için kaldırıldı
     # representative = db.relationship('User', backref='returns')
 
+class Purchase(db.Model):
+    """ERP'den gelen alış satırları (ALIS_SATIS = 'alis')"""
+    id = db.Column(db.Integer, primary_key=True)
+    representative_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Alış satırlarında temsilci çoğu zaman boş
+    date = db.Column(db.Date, nullable=False, index=True)
+    invoice_no = db.Column(db.String(50), nullable=True, index=True)  # FATURANO
+    supplier_code = db.Column(db.String(50), nullable=True)   # CARIKODU
+    supplier_name = db.Column(db.String(200), nullable=True)  # CARIADI
+    stock_code = db.Column(db.String(100), nullable=True)     # STOKKODU
+    warehouse_code = db.Column(db.String(50), nullable=True)  # DEPOKODU
+    product_group = db.Column(db.String(100), nullable=False)
+    brand = db.Column(db.String(100), nullable=False)
+    product_name = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    net_price = db.Column(db.Float, nullable=False)
+    # JSON'dan gelen orijinal alanlar
+    original_quantity = db.Column(db.String(20), nullable=True)  # ADET alanından
+    original_date = db.Column(db.String(20), nullable=True)      # TARIH alanından
+    original_product_group = db.Column(db.String(100), nullable=True)  # URUN_ANA_GRUP alanından
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PurchaseMonthly(db.Model):
+    """Alışların ay/ürün grubu/marka bazlı özet tablosu (import sırasında yenilenir)"""
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    product_group = db.Column(db.String(100), nullable=False)
+    brand = db.Column(db.String(100), nullable=False)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Integer, nullable=False, default=0)
+    total_price = db.Column(db.Float, nullable=False, default=0)
+    net_price = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('year', 'month', 'product_group', 'brand', name='unique_purchase_monthly'),)
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -286,6 +338,14 @@ class Notification(db.Model):
     to_user = db.relationship('User', foreign_keys=[to_user_id])
     created_by = db.relationship('User', foreign_keys=[created_by_id])
 
+class NotificationCounter(db.Model):
+    """Kullanıcı başına okunmamış bildirim sayısı (satır yoksa 0).
+    Bildirim yazımında artırılır, okuma/silmede azaltılır (notifications.py); bakım işi periyodik
+    olarak Notification tablosundan yeniden sayar.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -303,12 +363,15 @@ class Task(db.Model):
 
     # Dates
     start_date = db.Column(db.Date, nullable=True)
-    due_date = db.Column(db.Date, nullable=True)
+    due_date = db.Column(db.Date, nullable=True, index=True)
 
     # Recurrence
     is_recurring = db.Column(db.Boolean, default=False, nullable=False)
     recurrence = db.Column(db.String(50), default='none', nullable=False)
 
+    # Yorum sayısı (yorum eklenince/silinince güncellenir; listelerde alt sorgu gerekmez)
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -319,6 +382,53 @@ class Task(db.Model):
     created_by = db.relationship('User', foreign_keys=[created_by_id], lazy=True)
     department = db.relationship('Department', foreign_keys=[department_id], lazy=True)
 
+class TaskOccurrence(db.Model):
+    """Görevin takvimde göründüğü günler (tekrarlar dahil), ilgili her kullanıcı (atanan/oluşturan) için bir satır.
+    Açık uçlu tekrarlar kayan bir ufka kadar açılır; ufuk bakım işiyle ileri taşınır (bkz. task_occurrences.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'user_id', 'date', name='unique_task_occurrence'),
+        db.Index('ix_task_occurrence_user_date', 'user_id', 'date'),
+    )
+
+class TaskReminder(db.Model):
+    """Gönderilmiş bitiş hatırlatmaları: aynı görev/kişi/tür için günde en fazla bir bildirim"""
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'due_soon', 'overdue'
+    day = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('task_id', 'user_id', 'kind', 'day', name='unique_task_reminder'),)
+
+class UserDayActivity(db.Model):
+    """Kullanıcı × gün etkinlik özeti; takvimler tek indeksli aralık okumasıyla çizilir (bkz. day_activity.py).
+    Satırlar Planning, PlanningSnapshot ve Task yazımlarında yeniden hesaplanır; boş günler için satır tutulmaz.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    has_plan = db.Column(db.Boolean, default=False, nullable=False)
+    snapshot_count = db.Column(db.Integer, default=0, nullable=False)
+    task_start_count = db.Column(db.Integer, default=0, nullable=False)  # atama günü: start_date, yoksa oluşturulma günü
+    task_due_count = db.Column(db.Integer, default=0, nullable=False)
+    occurrence_count = db.Column(db.Integer, default=0, nullable=False)  # task_occurrence satırları (tekrarlar dahil)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='unique_user_day_activity'),)
+
+class CalendarToken(db.Model):
+    """Kişisel iCalendar (.ics) akışı için gizli erişim anahtarı"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    token = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class TaskComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
@@ -328,4 +438,41 @@ class TaskComment(db.Model):
 
     task = db.relationship('Task', backref=db.backref('comments', lazy=True, cascade='all, delete-orphan'))
     # İlişki çakışmasını önlemek için foreign key kullanıldı
-    # user = db.relationship('User', viewonly=True, overlaps="task_comments")
\ No newline at end of file
+    # user = db.relationship('User', viewonly=True, overlaps="task_comments")
+
+    __table_args__ = (db.Index('ix_task_comment_task_id_id', 'task_id', 'id'),)
+
+class SearchDocument(db.Model):
+    """Tam metin arama satırı: plan, görev veya yorum başına bir kayıt (bkz. search.py).
+    user_id / other_user_id kapsam kontrolü içindir (plan: temsilci; görev ve yorum: atanan / oluşturan).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'plan', 'task', 'comment'
+    source_id = db.Column(db.Integer, nullable=False)
+    task_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    other_user_id = db.Column(db.Integer, nullable=True, index=True)
+    day = db.Column(db.Date, nullable=True)
+    title = db.Column(db.String(200), nullable=True)
+    body = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (db.UniqueConstraint('kind', 'source_id', name='unique_search_document'),)
+
+class ExportJob(db.Model):
+    """Arka planda üretilen dışa aktarım dosyaları (UPLOAD_FOLDER/exports altında önbelleklenir)"""
+    id = db.Column(db.Integer, primary_key=True)
+    # (rapor tipi, kapsam, parametreler, veri sürümü) özeti – aynı anahtar aynı dosya demektir
+    cache_key = db.Column(db.String(64), nullable=False, index=True)
+    report_type = db.Column(db.String(50), nullable=False)  # 'sales', 'returns', 'planning'
+    params = db.Column(db.Text, nullable=True)  # JSON
+    scope = db.Column(db.Text, nullable=True)   # JSON: kapsamdaki kullanıcı id'leri, null = tümü (admin)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, ready, failed
+    file_name = db.Column(db.String(255), nullable=True)
+    download_name = db.Column(db.String(255), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow)
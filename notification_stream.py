@@ -0,0 +1,158 @@
+"""Bildirimler için Server-Sent Events (SSE) yayın kanalı.
+
+Süreç içi hafif bir pub/sub: her açık akış (sekme) kullanıcı id'si altında bir kuyruğa abone
+olur. Bildirimi değişen kullanıcıların id'leri işlem commit edildikten sonra yayınlanır; akış
+yeni bildirimleri ve okunmamış sayısını kendisi okuyup istemciye iter (mesajda veri taşınmaz).
+
+Worker'lar arası aktarım: PostgreSQL'de değişiklikler işlemle birlikte NOTIFY ile gönderilir
+(commit'te teslim edilir) ve her worker'daki tek dinleyici thread bunları yerel abonelere
+dağıtır. SQLite (tek süreç geliştirme ortamı) için yayın doğrudan yereldir.
+"""
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+RELAY_CHANNEL = 'notification_changes'
+RELAY_WAIT_SECONDS = 30  # psycopg2: soket bu kadar beklenir
+RELAY_POLL_SECONDS = 1.0  # pg8000: bu aralıkla yoklanır
+RELAY_RETRY_SECONDS = 5
+# pg_notify yükü 8000 bayt ile sınırlı; daha fazla kullanıcı parçalara bölünür
+RELAY_IDS_PER_MESSAGE = 500
+
+_lock = threading.Lock()
+_subscribers = {}  # {kullanıcı id: {queue.Queue, ...}}
+_relay_thread = None
+_open_streams = 0  # bu worker'da açık akış sayısı
+
+
+def acquire_stream_slot(limit):
+    """Worker başına akış sınırı: yer varsa sayacı artırıp True döner (thread'lerin tamamı
+    akışlara kilitlenip sıradan isteklere yer kalmamasını önler)"""
+    global _open_streams
+    with _lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream_slot():
+    global _open_streams
+    with _lock:
+        _open_streams = max(_open_streams - 1, 0)
+
+
+def subscribe(user_id):
+    q = queue.Queue()
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(q)
+    return q
+
+
+def unsubscribe(user_id, q):
+    with _lock:
+        queues = _subscribers.get(user_id)
+        if queues:
+            queues.discard(q)
+            if not queues:
+                del _subscribers[user_id]
+
+
+def publish_local(user_ids):
+    """Bu süreçteki abonelere 'değişti' sinyali gönder"""
+    with _lock:
+        targets = [q for uid in user_ids for q in _subscribers.get(uid, ())]
+    for q in targets:
+        q.put_nowait(True)
+
+
+def mark_changed(session, user_ids):
+    """Bildirimleri/okunmamış sayısı değişen kullanıcıları işaretle; commit sonrası yayınlanır"""
+    session.info.setdefault('notification_changes', set()).update(uid for uid in user_ids if uid)
+
+
+# --- Worker'lar arası aktarım (PostgreSQL LISTEN/NOTIFY) -------------------
+
+def relay_enabled(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def relay_loop(engine):
+    while True:
+        try:
+            raw = engine.raw_connection()
+            try:
+                dbapi_conn = raw.driver_connection
+                dbapi_conn.autocommit = True
+                cursor = dbapi_conn.cursor()
+                cursor.execute(f'LISTEN {RELAY_CHANNEL}')
+                while True:
+                    for payload in read_notifications(dbapi_conn, cursor):
+                        publish_local([int(uid) for uid in payload.split(',') if uid])
+            finally:
+                raw.invalidate()
+        except Exception as e:
+            print(f"[NOTIFY] dinleyici hatası: {e}")
+            time.sleep(RELAY_RETRY_SECONDS)
+
+
+def read_notifications(dbapi_conn, cursor):
+    """Gelen NOTIFY yüklerini bekle ve döndür (psycopg2: soket beklenir, pg8000: kısa aralıklı yoklama)"""
+    if hasattr(dbapi_conn, 'poll'):
+        if select.select([dbapi_conn], [], [], RELAY_WAIT_SECONDS) == ([], [], []):
+            return []
+        dbapi_conn.poll()
+        payloads = [n.payload for n in dbapi_conn.notifies]
+        dbapi_conn.notifies.clear()
+        return payloads
+    time.sleep(RELAY_POLL_SECONDS)
+    cursor.execute('SELECT 1')
+    payloads = []
+    while dbapi_conn.notifications:
+        payloads.append(dbapi_conn.notifications.popleft()[2])
+    return payloads
+
+
+def ensure_relay(engine):
+    """Dinleyici thread'i (gerekirse) başlat; ilk akış açıldığında çağrılır"""
+    global _relay_thread
+    if not relay_enabled(engine):
+        return
+    with _lock:
+        if _relay_thread is not None and _relay_thread.is_alive():
+            return
+        _relay_thread = threading.Thread(target=relay_loop, args=(engine,), name='notification-relay', daemon=True)
+        _relay_thread.start()
+
+
+@event.listens_for(Session, 'before_commit')
+def relay_changes_before_commit(session):
+    """PostgreSQL: NOTIFY işlemin parçasıdır, commit'te tüm worker'lara (bu worker dahil) teslim edilir"""
+    changes = session.info.get('notification_changes')
+    if not changes or not relay_enabled(session.get_bind()):
+        return
+    user_ids = sorted(changes)
+    for i in range(0, len(user_ids), RELAY_IDS_PER_MESSAGE):
+        session.execute(text('SELECT pg_notify(:channel, :payload)'), {
+            'channel': RELAY_CHANNEL,
+            'payload': ','.join(str(uid) for uid in user_ids[i:i + RELAY_IDS_PER_MESSAGE]),
+        })
+    session.info['notification_changes_relayed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_changes_after_commit(session):
+    changes = session.info.pop('notification_changes', None)
+    relayed = session.info.pop('notification_changes_relayed', False)
+    if changes and not relayed:
+        publish_local(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changes_after_rollback(session):
+    session.info.pop('notification_changes', None)
+    session.info.pop('notification_changes_relayed', None)
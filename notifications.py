@@ -0,0 +1,211 @@
+"""Bildirim dağıtımı (fan-out).
+
+Olay başına alıcı listesi bellekte kurulur ve bildirimler tek toplu INSERT ile yazılır.
+Departman → yönetici ve admin kümeleri her olayda sorgulanmaz; süreç içi önbellekte tutulur.
+Yazılan bildirimlerin alıcıları commit sonrası SSE akışlarına duyurulur (notification_stream.py).
+Önbellek bu süreçte User rol/departman değişikliği commit edildiğinde boşaltılır; diğer
+worker'lardaki değişiklikler için NOTIFICATION_RECIPIENT_CACHE_SECONDS sonra yenilenir. Bu arada
+başka worker'da silinmiş bir kullanıcı önbellekte kalabileceği için alıcılar yazmadan önce
+users tablosuna karşı süzülür (FK hatası yerine satır düşer ve önbellek boşaltılır).
+Okunmamış sayıları NotificationCounter'da tutulur: okuma tek birincil anahtar erişimidir.
+"""
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Notification, NotificationCounter, User, UserRole
+from notification_stream import mark_changed
+
+# Bu alanlardan biri değişen kullanıcı alıcı kümelerini etkiler
+RECIPIENT_FIELDS = ('role', 'department_id')
+
+_lock = threading.Lock()
+_recipients = None  # {'admins': (id, ...), 'managers': {departman id: yönetici id}, 'loaded_at': float}
+
+
+def invalidate_recipient_cache():
+    global _recipients
+    with _lock:
+        _recipients = None
+
+
+def recipient_sets():
+    """Önbellekli alıcı kümeleri; süresi dolduysa tek sorguda yeniden yüklenir"""
+    global _recipients
+    ttl = current_app.config.get('NOTIFICATION_RECIPIENT_CACHE_SECONDS', 60)
+    cached = _recipients
+    if cached is not None and time.monotonic() - cached['loaded_at'] < ttl:
+        return cached
+    rows = db.session.query(User.id, User.role, User.department_id).filter(
+        User.role.in_([UserRole.ADMIN, UserRole.DEPARTMENT_MANAGER])
+    ).order_by(User.id.asc()).all()
+    managers = {}
+    for uid, role, department_id in rows:
+        if role == UserRole.DEPARTMENT_MANAGER and department_id:
+            # Departmanda birden fazla yönetici varsa en eski kayıt (id sırası) bildirim alır
+            managers.setdefault(department_id, uid)
+    cached = {
+        'admins': tuple(uid for uid, role, _ in rows if role == UserRole.ADMIN),
+        'managers': managers,
+        'loaded_at': time.monotonic(),
+    }
+    with _lock:
+        _recipients = cached
+    return cached
+
+
+def admin_ids():
+    return recipient_sets()['admins']
+
+
+def department_manager_id(department_id):
+    return recipient_sets()['managers'].get(department_id) if department_id else None
+
+
+def event_recipients(department_id=None, extra=(), exclude=None, admins=True):
+    """Olay alıcıları: ek kullanıcılar + departman yöneticisi + (istenirse) adminler; exclude hariç"""
+    user_ids = {uid for uid in extra if uid}
+    manager_id = department_manager_id(department_id)
+    if manager_id:
+        user_ids.add(manager_id)
+    if admins:
+        user_ids.update(admin_ids())
+    user_ids.discard(exclude)
+    return user_ids
+
+
+def send_notifications(rows):
+    """Hazır bildirim satırlarını tek INSERT ile yaz (commit çağırana aittir). Yazılan satır sayısını döner."""
+    if not rows:
+        return 0
+    recipient_ids = {row['to_user_id'] for row in rows}
+    existing = set(db.session.scalars(select(User.id).where(User.id.in_(recipient_ids))))
+    if existing != recipient_ids:
+        invalidate_recipient_cache()
+        rows = [row for row in rows if row['to_user_id'] in existing]
+        if not rows:
+            return 0
+    now = datetime.utcnow()
+    rows = [dict({'is_read': False, 'created_at': now}, **row) for row in rows]
+    db.session.execute(insert(Notification), rows)
+    counts = {}
+    for row in rows:
+        if not row['is_read']:
+            counts[row['to_user_id']] = counts.get(row['to_user_id'], 0) + 1
+    increment_unread(counts)
+    mark_changed(db.session, {row['to_user_id'] for row in rows})
+    return len(rows)
+
+
+# --- Okunmamış sayaçları ---------------------------------------------------
+
+def unread_notification_count(user_id):
+    counter = db.session.get(NotificationCounter, user_id)
+    return max(counter.unread, 0) if counter else 0
+
+
+def increment_unread(counts):
+    """counts: {kullanıcı id: artış}; tek INSERT ... ON CONFLICT DO UPDATE ile atomik"""
+    if not counts:
+        return
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(NotificationCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={'unread': NotificationCounter.unread + stmt.excluded.unread},
+    )
+    db.session.execute(stmt, [{'user_id': uid, 'unread': n} for uid, n in sorted(counts.items())])
+
+
+def decrement_unread(user_id, count=1):
+    db.session.execute(
+        update(NotificationCounter).where(NotificationCounter.user_id == user_id)
+        .values(unread=case((NotificationCounter.unread > count, NotificationCounter.unread - count), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mark_read(notification_id, user_id):
+    """Bildirimi okundu işaretle; yalnız gerçekten okunmamışsa sayaç azalır (eşzamanlı çift tıklama
+    tek kez sayılır). Durum değiştiyse True döner.
+    """
+    result = db.session.execute(
+        update(Notification).where(Notification.id == notification_id, Notification.to_user_id == user_id,
+                                   Notification.is_read == False)
+        .values(is_read=True, read_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    decrement_unread(user_id)
+    mark_changed(db.session, [user_id])
+    return True
+
+
+def recount_unread(user_ids=None):
+    """Sayaçları Notification tablosundan yeniden yaz (user_ids None ise tümü). Güncellenen satır sayısını döner.
+    Tabloyu boşaltıp yeniden doldurmak yerine upsert edilir: eşzamanlı increment_unread satırı
+    silinmiş bulup kaybolmaz. Okunmamış bildirimi kalmayan sayaçlar ayrıca silinir.
+    """
+    unread = select(Notification.to_user_id, func.count(Notification.id)).where(Notification.is_read == False)
+    stale = delete(NotificationCounter).where(~select(Notification.id).where(
+        Notification.to_user_id == NotificationCounter.user_id, Notification.is_read == False
+    ).exists())
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return 0
+        unread = unread.where(Notification.to_user_id.in_(user_ids))
+        stale = stale.where(NotificationCounter.user_id.in_(user_ids))
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(NotificationCounter).from_select(['user_id', 'unread'], unread.group_by(Notification.to_user_id))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={'unread': stmt.excluded.unread},
+    )
+    result = db.session.execute(stmt)
+    db.session.execute(stale.execution_options(synchronize_session=False))
+    return result.rowcount
+
+
+def notify(user_ids, created_by_id, title, message, url='/tasks', entity_type='task', entity_id=None):
+    """Aynı bildirimi birden fazla kullanıcıya gönder"""
+    return send_notifications([dict(
+        to_user_id=uid,
+        created_by_id=created_by_id,
+        title=title,
+        message=message,
+        url=url,
+        entity_type=entity_type,
+        entity_id=entity_id
+    ) for uid in sorted(user_ids)])
+
+
+@event.listens_for(Session, 'after_flush')
+def mark_recipient_changes(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User):
+            session.info['recipients_changed'] = True
+            return
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in RECIPIENT_FIELDS):
+                session.info['recipients_changed'] = True
+                return
+
+
+@event.listens_for(Session, 'after_commit')
+def clear_recipients_after_commit(session):
+    if session.info.pop('recipients_changed', False):
+        invalidate_recipient_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_recipient_changes(session):
+    session.info.pop('recipients_changed', None)
@@ -0,0 +1,92 @@
+"""Görev bitiş hatırlatmaları.
+
+Saatlik bakım işi due_date indeksini bir kez tarar ve "bitişi yaklaşıyor" / "gecikti"
+bildirimlerini toplu üretir. TaskReminder tablosu (görev, kişi, tür, gün) başına tek kayıt
+tuttuğundan iş gün içinde kaç kez (veya kaç worker'da) çalışırsa çalışsın aynı gün
+ikinci bildirim oluşmaz. İstemciler yalnızca bildirim kanalını dinler.
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Task, TaskReminder
+from notifications import send_notifications
+
+TZ_TR = ZoneInfo('Europe/Istanbul')
+OPEN_TASK_STATUSES = ('pending', 'in_progress', 'requested')
+REMINDER_RETENTION_DAYS = 30
+
+
+def reminder_payload(kind, task, today):
+    due = task.due_date.isoformat()
+    if kind == 'overdue':
+        return 'Görev gecikti', f"{task.title or 'Görev'} • Bitiş: {due}"
+    diff = (task.due_date - today).days
+    when = ' (Bugün)' if diff <= 0 else (' (Yarın)' if diff == 1 else '')
+    return 'Görev bitişi yaklaşıyor', f"{task.title or 'Görev'} • Bitiş: {due}{when}"
+
+
+def generate_due_reminders(today=None):
+    """Bugün için eksik hatırlatmaları üret. Oluşturulan bildirim sayısını döner."""
+    today = today or datetime.now(TZ_TR).date()
+    due_soon_days = current_app.config.get('TASK_DUE_SOON_DAYS', 3)
+    overdue_days = current_app.config.get('TASK_OVERDUE_REMINDER_DAYS', 7)
+
+    # Tek aralık taraması (task.due_date indeksi): [bugün - gecikme penceresi, bugün + yaklaşma penceresi]
+    tasks = db.session.query(Task.id, Task.title, Task.due_date, Task.assigned_to_id, Task.created_by_id).filter(
+        Task.due_date >= today - timedelta(days=overdue_days),
+        Task.due_date <= today + timedelta(days=due_soon_days),
+        Task.status.in_(OPEN_TASK_STATUSES)
+    ).all()
+    if not tasks:
+        return 0
+
+    already = {(r.task_id, r.user_id, r.kind) for r in db.session.query(
+        TaskReminder.task_id, TaskReminder.user_id, TaskReminder.kind
+    ).filter(TaskReminder.day == today, TaskReminder.task_id.in_([t.id for t in tasks])).all()}
+
+    reminder_rows, notification_rows = [], []
+    now = datetime.utcnow()
+    for task in tasks:
+        kind = 'overdue' if task.due_date < today else 'due_soon'
+        # Alıcı: atanan kişi, atanmamışsa oluşturan
+        user_id = task.assigned_to_id or task.created_by_id
+        if not user_id or (task.id, user_id, kind) in already:
+            continue
+        title, message = reminder_payload(kind, task, today)
+        reminder_rows.append(dict(task_id=task.id, user_id=user_id, kind=kind, day=today, created_at=now))
+        notification_rows.append(dict(
+            to_user_id=user_id,
+            created_by_id=None,
+            title=title,
+            message=message,
+            url='/tasks',
+            entity_type='task',
+            entity_id=task.id,
+            is_read=False,
+            created_at=now
+        ))
+    if not reminder_rows:
+        return 0
+
+    try:
+        db.session.execute(insert(TaskReminder), reminder_rows)
+        send_notifications(notification_rows)
+        db.session.commit()
+    except IntegrityError:
+        # Başka bir worker aynı anda üretti; benzersiz kısıt tekrarları engelledi
+        db.session.rollback()
+        return 0
+    return len(notification_rows)
+
+
+def prune_task_reminders(today=None):
+    today = today or datetime.now(TZ_TR).date()
+    deleted = TaskReminder.query.filter(
+        TaskReminder.day < today - timedelta(days=REMINDER_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,268 @@
+"""Planlar, görevler ve görev yorumları üzerinde tam metin arama.
+
+Aranabilir metin tek bir `search_document` tablosunda tutulur (kaynak başına bir satır,
+kapsam için sahip kullanıcı id'leri ve tarih ile birlikte). Tam metin indeksi veritabanına göre:
+  - SQLite: FTS5 external-content tablosu (`search_document_fts`), tetikleyicilerle senkron
+  - PostgreSQL: üretilmiş `tsv` (tsvector) sütunu + GIN indeksi
+Satırlar ORM flush'ı sırasında güncellenir; ORM dışı toplu yazımlar reindex_* fonksiyonlarını çağırır.
+"""
+import html
+import re
+
+from sqlalchemy import delete, event, func, insert, inspect, literal_column, or_, select, table, column, text
+from sqlalchemy.orm import Session
+
+from models import db, Planning, Task, TaskComment, SearchDocument
+
+FTS_TABLE = 'search_document_fts'
+INSERT_CHUNK = 1000
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+# Bu alanlardan biri değişirse kaynak yeniden indekslenir
+PLAN_SEARCH_FIELDS = ('representative_id', 'date', 'yesterday_activities', 'today_plan', 'challenges')
+TASK_SEARCH_FIELDS = ('title', 'description', 'assigned_to_id', 'created_by_id', 'due_date', 'created_at')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, body, content='search_document', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+    f"CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+)
+POSTGRES_FTS_DDL = (
+    "ALTER TABLE search_document ADD COLUMN IF NOT EXISTS tsv tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_tsv ON search_document USING GIN (tsv)",
+)
+
+_backend = None
+
+
+def search_backend():
+    """'postgresql', 'fts5' veya (FTS5 derlenmemiş SQLite için) 'like'"""
+    global _backend
+    if _backend is None:
+        if db.engine.dialect.name == 'postgresql':
+            _backend = 'postgresql'
+        else:
+            exists = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}).scalar()
+            _backend = 'fts5' if exists else 'like'
+    return _backend
+
+
+def ensure_search_index():
+    """Tam metin indeksini (yoksa) oluştur; tablo boşsa kaynaklardan doldur. Başlangıçta çağrılır."""
+    global _backend
+    _backend = None
+    statements = POSTGRES_FTS_DDL if db.engine.dialect.name == 'postgresql' else SQLITE_FTS_DDL
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    if not db.session.query(SearchDocument.id).first() and (
+            db.session.query(Planning.id).first() or db.session.query(Task.id).first()):
+        return rebuild_search_documents()
+    return 0
+
+
+# --- Belge üretimi ---------------------------------------------------------
+
+def join_text(*parts):
+    return '\n'.join(p for p in parts if p)
+
+
+def plan_documents(connection, plan_ids=None):
+    stmt = select(Planning.id, Planning.representative_id, Planning.date,
+                  Planning.yesterday_activities, Planning.today_plan, Planning.challenges)
+    if plan_ids is not None:
+        stmt = stmt.where(Planning.id.in_(plan_ids))
+    return [dict(kind='plan', source_id=p.id, task_id=None, user_id=p.representative_id, other_user_id=None,
+                 day=p.date, title=None, body=join_text(p.today_plan, p.yesterday_activities, p.challenges))
+            for p in connection.execute(stmt)]
+
+
+def task_documents(connection, task_ids=None):
+    stmt = select(Task.id, Task.title, Task.description, Task.assigned_to_id, Task.created_by_id,
+                  Task.due_date, Task.created_at)
+    if task_ids is not None:
+        stmt = stmt.where(Task.id.in_(task_ids))
+    return [dict(kind='task', source_id=t.id, task_id=t.id, user_id=t.assigned_to_id, other_user_id=t.created_by_id,
+                 day=t.due_date or (t.created_at.date() if t.created_at else None), title=t.title, body=t.description)
+            for t in connection.execute(stmt)]
+
+
+def comment_documents(connection, comment_ids=None, task_ids=None):
+    """Yorumlar görevin kapsamını taşır: göreve erişebilen yorumu da görür. Başlık indekslenmez (görevde zaten var)."""
+    stmt = select(TaskComment.id, TaskComment.task_id, TaskComment.comment, TaskComment.created_at,
+                  Task.assigned_to_id, Task.created_by_id).join(Task, Task.id == TaskComment.task_id)
+    if comment_ids is not None:
+        stmt = stmt.where(TaskComment.id.in_(comment_ids))
+    if task_ids is not None:
+        stmt = stmt.where(TaskComment.task_id.in_(task_ids))
+    return [dict(kind='comment', source_id=c.id, task_id=c.task_id, user_id=c.assigned_to_id, other_user_id=c.created_by_id,
+                 day=c.created_at.date() if c.created_at else None, title=None, body=c.comment)
+            for c in connection.execute(stmt)]
+
+
+def insert_documents(connection, rows):
+    for i in range(0, len(rows), INSERT_CHUNK):
+        connection.execute(insert(SearchDocument.__table__), rows[i:i + INSERT_CHUNK])
+
+
+def remove_documents(connection, kind, source_ids):
+    connection.execute(delete(SearchDocument.__table__).where(
+        SearchDocument.kind == kind, SearchDocument.source_id.in_(source_ids)))
+
+
+def reindex_plans(plan_ids, connection=None):
+    plan_ids = list(plan_ids)
+    if not plan_ids:
+        return
+    connection = connection or db.session.connection()
+    remove_documents(connection, 'plan', plan_ids)
+    insert_documents(connection, plan_documents(connection, plan_ids))
+
+
+def reindex_tasks(task_ids, connection=None):
+    """Görev satırlarını ve (sahipleri değişmiş olabileceği için) yorumlarını yenile; silinmiş görevler düşer"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    connection = connection or db.session.connection()
+    remove_documents(connection, 'task', task_ids)
+    connection.execute(delete(SearchDocument.__table__).where(
+        SearchDocument.kind == 'comment', SearchDocument.task_id.in_(task_ids)))
+    insert_documents(connection, task_documents(connection, task_ids) + comment_documents(connection, task_ids=task_ids))
+
+
+def reindex_comments(comment_ids, connection=None):
+    comment_ids = list(comment_ids)
+    if not comment_ids:
+        return
+    connection = connection or db.session.connection()
+    remove_documents(connection, 'comment', comment_ids)
+    insert_documents(connection, comment_documents(connection, comment_ids=comment_ids))
+
+
+def reindex_user_documents(user_id):
+    """Kullanıcı silme/devri gibi toplu değişiklikler sonrası o kullanıcıya bağlı belgeleri yenile"""
+    connection = db.session.connection()
+    rows = connection.execute(select(SearchDocument.kind, SearchDocument.source_id, SearchDocument.task_id).where(
+        or_(SearchDocument.user_id == user_id, SearchDocument.other_user_id == user_id))).all()
+    reindex_plans([r.source_id for r in rows if r.kind == 'plan'], connection)
+    reindex_tasks({r.task_id for r in rows if r.kind != 'plan'}, connection)
+
+
+def rebuild_search_documents():
+    """Tabloyu baştan doldur (ilk kurulum / onarım). Yazılan satır sayısını döner."""
+    connection = db.session.connection()
+    connection.execute(delete(SearchDocument.__table__))
+    rows = plan_documents(connection) + task_documents(connection) + comment_documents(connection)
+    insert_documents(connection, rows)
+    db.session.commit()
+    return len(rows)
+
+
+def fields_changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def sync_search_documents_after_flush(session, flush_context):
+    """Plan/görev/yorum eklendiğinde, değiştiğinde veya silindiğinde arama satırlarını aynı işlemde güncelle"""
+    plans, tasks, comments = set(), set(), set()
+    for obj in session.new:
+        if isinstance(obj, Planning):
+            plans.add(obj.id)
+        elif isinstance(obj, Task):
+            tasks.add(obj.id)
+        elif isinstance(obj, TaskComment):
+            comments.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Planning) and fields_changed(obj, PLAN_SEARCH_FIELDS):
+            plans.add(obj.id)
+        elif isinstance(obj, Task) and fields_changed(obj, TASK_SEARCH_FIELDS):
+            tasks.add(obj.id)
+        elif isinstance(obj, TaskComment) and fields_changed(obj, ('comment', 'task_id')):
+            comments.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Planning):
+            plans.add(obj.id)
+        elif isinstance(obj, Task):
+            tasks.add(obj.id)
+        elif isinstance(obj, TaskComment):
+            comments.add(obj.id)
+    if not (plans or tasks or comments):
+        return
+    connection = session.connection()
+    reindex_plans(plans, connection)
+    reindex_tasks(tasks, connection)
+    reindex_comments(comments, connection)
+
+
+# --- Sorgu -----------------------------------------------------------------
+
+def query_tokens(q):
+    return [t.lower() for t in TOKEN_RE.findall(q or '')][:12]
+
+
+def search_documents(q, kinds=None, scoped_ids=None, user_id=None, start=None, end=None, limit=20, offset=0):
+    """Sıralı sonuçlar: [(satır, snippet)]. Tüm kelimeler (önek eşleşmesiyle) aranır."""
+    tokens = query_tokens(q)
+    if not tokens:
+        return []
+    backend = search_backend()
+    filters = []
+    if kinds:
+        filters.append(SearchDocument.kind.in_(kinds))
+    if scoped_ids is not None:
+        filters.append(or_(SearchDocument.user_id.in_(scoped_ids), SearchDocument.other_user_id.in_(scoped_ids)))
+    if user_id:
+        filters.append(or_(SearchDocument.user_id == user_id, SearchDocument.other_user_id == user_id))
+    if start:
+        filters.append(SearchDocument.day >= start)
+    if end:
+        filters.append(SearchDocument.day <= end)
+    columns = (SearchDocument.id, SearchDocument.kind, SearchDocument.source_id, SearchDocument.task_id,
+               SearchDocument.user_id, SearchDocument.other_user_id, SearchDocument.day, SearchDocument.title)
+
+    # Sıralama önce yalnızca id'ler üzerinde yapılır; pahalı snippet/headline sadece sayfadaki satırlar için üretilir
+    if backend == 'fts5':
+        fts = table(FTS_TABLE, column('rowid'))
+        fts_ref = literal_column(FTS_TABLE)
+        match = fts_ref.op('MATCH')(' '.join('"%s"*' % t.replace('"', '') for t in tokens))
+        rows = db.session.execute(select(*columns).select_from(fts).join(
+            SearchDocument, SearchDocument.id == fts.c.rowid
+        ).where(match, *filters).order_by(func.bm25(fts_ref, 5.0, 1.0), SearchDocument.id.desc()).limit(limit).offset(offset)).all()
+        if not rows:
+            return []
+        snippets = dict(db.session.execute(select(fts.c.rowid, func.snippet(fts_ref, 1, SNIPPET_START, SNIPPET_END, '…', 16))
+                                           .where(match, fts.c.rowid.in_([r.id for r in rows]))).all())
+        return [(r, snippets.get(r.id) or (r.title or '')) for r in rows]
+    if backend == 'postgresql':
+        tsv = literal_column('search_document.tsv')
+        ts_query = func.to_tsquery('simple', ' & '.join(f'{t}:*' for t in tokens))
+        rank = func.ts_rank_cd(tsv, ts_query)
+        ranked = select(*columns, SearchDocument.body, rank.label('rank')).where(tsv.op('@@')(ts_query), *filters).order_by(
+            rank.desc(), SearchDocument.id.desc()).limit(limit).offset(offset).subquery()
+        snippet = func.ts_headline('simple', func.coalesce(ranked.c.body, ''), ts_query,
+                                   f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=30, MinWords=12')
+        # Alt sorgunun sırası dış sorguda korunmaz; sıralama dışarıda tekrarlanır
+        rows = db.session.execute(select(ranked, snippet.label('snippet'))
+                                  .order_by(ranked.c.rank.desc(), ranked.c.id.desc())).all()
+        return [(r, r.snippet) for r in rows]
+    text_filters = [or_(SearchDocument.title.ilike(f'%{t}%'), SearchDocument.body.ilike(f'%{t}%')) for t in tokens]
+    rows = db.session.execute(select(*columns, SearchDocument.body).where(*text_filters, *filters).order_by(
+        SearchDocument.day.desc(), SearchDocument.id.desc()).limit(limit).offset(offset)).all()
+    return [(r, (r.body or '')[:200]) for r in rows]
+
+
+def snippet_html(snippet):
+    """Kullanıcı metnini kaçışla, eşleşmeleri <mark> ile işaretle"""
+    return html.escape(snippet or '').replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
@@ -0,0 +1,147 @@
+"""Plan snapshot geçmişi: fark (delta) ile saklama ve tam sürümlerin yeniden kurulması.
+
+Her kullanıcı-gün zinciri id sırasıyla okunur. Zincirin ilk satırı (ve her
+SNAPSHOT_KEYFRAME_INTERVAL sürümde bir satır) tam metin tutar; diğer satırlar bir önceki
+sürüme göre alan bazlı farkları zlib ile sıkıştırılmış JSON olarak `delta` sütununda tutar.
+Eski satırlar (is_delta = False) zaten tam metin olduğu için göç gerekmez.
+
+Fark biçimi: {alan: None} alan boşaltıldı, {alan: [[i1, i2, metin], ...]} önceki metnin
+[i1:i2] aralığı metin ile değiştirildi. Listede olmayan alanlar değişmemiştir.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+from difflib import SequenceMatcher
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, PlanningSnapshot
+
+SNAPSHOT_FIELDS = ('yesterday_activities', 'today_plan', 'challenges')
+# Bu kadar sürümde bir tam metin yazılır: yeniden kurma maliyeti zincir uzunluğuyla sınırlı kalır
+SNAPSHOT_KEYFRAME_INTERVAL = 20
+TZ_TR = ZoneInfo('Europe/Istanbul')
+
+
+def text_delta(old, new):
+    """old -> new dönüşümü için değişen aralıklar"""
+    ops = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag != 'equal':
+            ops.append([i1, i2, new[j1:j2]])
+    return ops
+
+
+def apply_text_delta(old, ops):
+    parts = []
+    pos = 0
+    for i1, i2, replacement in ops:
+        parts.append(old[pos:i1])
+        parts.append(replacement)
+        pos = i2
+    parts.append(old[pos:])
+    return ''.join(parts)
+
+
+def encode_delta(previous, values):
+    """İki sürüm arasındaki fark; değişiklik yoksa None"""
+    delta = {}
+    for name in SNAPSHOT_FIELDS:
+        old, new = previous.get(name), values.get(name)
+        if old == new:
+            continue
+        delta[name] = None if new is None else text_delta(old or '', new)
+    if not delta:
+        return None
+    return zlib.compress(json.dumps(delta, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def apply_delta(previous, blob):
+    values = dict(previous)
+    for name, ops in json.loads(zlib.decompress(blob).decode('utf-8')).items():
+        values[name] = None if ops is None else apply_text_delta(previous.get(name) or '', ops)
+    return values
+
+
+def snapshot_versions(snapshots):
+    """Bir kullanıcı-gün zincirinin (id sıralı) satırlarından tam sürümler:
+    [{'id', 'yesterday_activities', 'today_plan', 'challenges', 'created_at'}]
+    """
+    versions = []
+    current = {name: None for name in SNAPSHOT_FIELDS}
+    for s in snapshots:
+        if s.is_delta and s.delta is not None:
+            current = apply_delta(current, s.delta)
+        else:
+            current = {name: getattr(s, name) for name in SNAPSHOT_FIELDS}
+        versions.append(dict(current, id=s.id, created_at=s.created_at))
+    return versions
+
+
+def load_snapshot_versions(user_ids, start, end=None):
+    """{(kullanıcı id, gün): [tam sürüm, ...]}; tek sorgu"""
+    end = end or start
+    chains = {}
+    for s in PlanningSnapshot.query.filter(
+        PlanningSnapshot.representative_id.in_(list(user_ids)),
+        PlanningSnapshot.date >= start,
+        PlanningSnapshot.date <= end,
+    ).order_by(PlanningSnapshot.representative_id, PlanningSnapshot.date, PlanningSnapshot.id).all():
+        chains.setdefault((s.representative_id, s.date), []).append(s)
+    return {key: snapshot_versions(chain) for key, chain in chains.items()}
+
+
+def add_planning_snapshot(user_id, day, values):
+    """Planın yeni sürümünü zincire ekle. Önceki sürümle aynıysa yazmaz ve None döner."""
+    chain = PlanningSnapshot.query.filter_by(representative_id=user_id, date=day).order_by(PlanningSnapshot.id).all()
+    values = {name: values.get(name) for name in SNAPSHOT_FIELDS}
+    snap = PlanningSnapshot(representative_id=user_id, date=day)
+    if chain:
+        previous = snapshot_versions(chain)[-1]
+        blob = encode_delta(previous, values)
+        if blob is None:
+            return None
+        # Son tam metinden bu yana zincir uzadıysa yeni tam metin başlat
+        since_full = next((i for i, s in enumerate(reversed(chain)) if not s.is_delta), len(chain))
+        if since_full + 1 < SNAPSHOT_KEYFRAME_INTERVAL:
+            snap.is_delta = True
+            snap.delta = blob
+    if not snap.is_delta:
+        for name in SNAPSHOT_FIELDS:
+            setattr(snap, name, values[name])
+    db.session.add(snap)
+    return snap
+
+
+def coalesce_planning_snapshots(before):
+    """Saklama politikası: `before` gününden eski günlerde ara sürümleri sil, günün ilk ve son
+    sürümünü tam metin olarak bırak. Silinen satır sayısını döner (ORM ile: gün etkinlik
+    indeksi flush'ta güncellenir).
+    """
+    days = db.session.query(PlanningSnapshot.representative_id, PlanningSnapshot.date).filter(
+        PlanningSnapshot.date < before
+    ).group_by(PlanningSnapshot.representative_id, PlanningSnapshot.date).having(func.count(PlanningSnapshot.id) > 2).all()
+    removed = 0
+    for user_id, day in days:
+        chain = PlanningSnapshot.query.filter_by(representative_id=user_id, date=day).order_by(PlanningSnapshot.id).all()
+        last_version = snapshot_versions(chain)[-1]
+        for s in chain[1:-1]:
+            db.session.delete(s)
+        removed += len(chain) - 2
+        last = chain[-1]
+        if last.is_delta:
+            for name in SNAPSHOT_FIELDS:
+                setattr(last, name, last_version[name])
+            last.is_delta = False
+            last.delta = None
+        db.session.commit()
+    return removed
+
+
+def coalesce_old_snapshots(today=None):
+    """Yapılandırılmış saklama süresine göre (PLANNING_SNAPSHOT_RETENTION_DAYS) birleştir"""
+    today = today or datetime.now(TZ_TR).date()
+    days = current_app.config.get('PLANNING_SNAPSHOT_RETENTION_DAYS', 30)
+    return coalesce_planning_snapshots(today - timedelta(days=days))
@@ -0,0 +1,208 @@
+"""Görev tekrarlarının (TaskOccurrence) hesaplanması ve senkronu.
+
+Takvim ve "bugün neler var" sorguları her gün × her görev için Python'da task_occurs_on
+çalıştırmak yerine (user_id, date) indeksli tek bir aralık sorgusuyla cevaplanır.
+Satırlar ORM flush'ı sırasında (görev eklendi / tarih, tekrar veya kişi değişti / silindi)
+otomatik güncellenir; açık uçlu tekrarlar bakım işiyle kayan ufka kadar ileri açılır.
+"""
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Task, TaskOccurrence
+
+TZ_TR = ZoneInfo('Europe/Istanbul')
+DEFAULT_HORIZON_DAYS = 400
+INSERT_CHUNK = 1000
+# Bu alanlardan biri değişirse görevin tekrar satırları yeniden hesaplanır
+OCCURRENCE_FIELDS = ('start_date', 'due_date', 'is_recurring', 'recurrence', 'assigned_to_id', 'created_by_id', 'created_at')
+TASK_OCCURRENCE_COLUMNS = (Task.id, Task.start_date, Task.due_date, Task.is_recurring, Task.recurrence,
+                           Task.assigned_to_id, Task.created_by_id, Task.created_at)
+
+
+def horizon_end() -> date:
+    """Açık uçlu tekrarların açıldığı son gün (TR bugünü + ufuk)"""
+    days = DEFAULT_HORIZON_DAYS
+    if has_app_context():
+        days = current_app.config.get('TASK_OCCURRENCE_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)
+    return datetime.now(TZ_TR).date() + timedelta(days=days)
+
+
+def recurrence_pattern(task):
+    """Tekrarlı değilse None, aksi halde 'daily' / 'weekly' / 'monthly' / 'yearly'"""
+    pattern = (getattr(task, 'recurrence', None) or 'none').lower()
+    if not task.is_recurring or pattern in ('none', ''):
+        return None
+    return pattern
+
+
+def task_anchor(task):
+    return task.start_date or task.due_date or (task.created_at.date() if task.created_at else None)
+
+
+def iter_task_occurrence_dates(task, start, end):
+    """[start, end] aralığında görevin göründüğü günler (task_occurs_on ile aynı kurallar)"""
+    pattern = recurrence_pattern(task)
+    if pattern is None:
+        for d in sorted({task.start_date, task.due_date} - {None}):
+            if start <= d <= end:
+                yield d
+        return
+
+    anchor = task_anchor(task)
+    if not anchor:
+        return
+    lo = max(start, anchor)
+    hi = min(end, task.due_date) if task.due_date else end
+    if lo > hi:
+        return
+
+    if pattern == 'daily':
+        d = lo
+        while d <= hi:
+            yield d
+            d += timedelta(days=1)
+    elif pattern == 'weekly':
+        d = lo + timedelta(days=(anchor.weekday() - lo.weekday()) % 7)
+        while d <= hi:
+            yield d
+            d += timedelta(days=7)
+    elif pattern == 'monthly':
+        y, m = lo.year, lo.month
+        while (y, m) <= (hi.year, hi.month):
+            if anchor.day <= monthrange(y, m)[1]:
+                d = date(y, m, anchor.day)
+                if lo <= d <= hi:
+                    yield d
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    elif pattern == 'yearly':
+        for y in range(lo.year, hi.year + 1):
+            try:
+                d = date(y, anchor.month, anchor.day)
+            except ValueError:  # 29 Şubat artık olmayan yılda
+                continue
+            if lo <= d <= hi:
+                yield d
+
+
+def task_occurrence_user_ids(task):
+    return sorted({task.assigned_to_id, task.created_by_id} - {None})
+
+
+def task_occurrence_rows(task, start, until):
+    user_ids = task_occurrence_user_ids(task)
+    if not user_ids:
+        return []
+    if recurrence_pattern(task) is None:
+        # Tekrarsız görevin en fazla iki günü vardır; ufukla sınırlanmaz (bakım işi yalnız tekrarlıları ileri açar)
+        until = date.max
+    return [{'task_id': task.id, 'user_id': uid, 'date': d}
+            for d in iter_task_occurrence_dates(task, start, until) for uid in user_ids]
+
+
+def insert_occurrence_rows(connection, rows):
+    for i in range(0, len(rows), INSERT_CHUNK):
+        connection.execute(insert(TaskOccurrence.__table__), rows[i:i + INSERT_CHUNK])
+
+
+def replace_task_occurrences(connection, tasks, until=None):
+    """Görevlerin tüm tekrar satırlarını silip yeniden yaz"""
+    if not tasks:
+        return
+    until = until or horizon_end()
+    connection.execute(delete(TaskOccurrence.__table__).where(TaskOccurrence.task_id.in_([t.id for t in tasks])))
+    rows = []
+    for task in tasks:
+        rows.extend(task_occurrence_rows(task, date.min, until))
+    insert_occurrence_rows(connection, rows)
+
+
+def resync_task_occurrences(task_ids):
+    """Toplu UPDATE ile (ORM dışında) değişen görevlerin satırlarını yenile"""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    tasks = db.session.execute(select(*TASK_OCCURRENCE_COLUMNS).where(Task.id.in_(task_ids))).all()
+    connection = db.session.connection()
+    connection.execute(delete(TaskOccurrence.__table__).where(TaskOccurrence.task_id.in_(task_ids)))
+    until = horizon_end()
+    rows = []
+    for task in tasks:
+        rows.extend(task_occurrence_rows(task, date.min, until))
+    insert_occurrence_rows(connection, rows)
+
+
+def extend_task_occurrences(until=None):
+    """Tekrarlı görevleri son açılan günden `until`'e kadar ileri aç. Eklenen satır sayısını döner."""
+    until = until or horizon_end()
+    tasks = db.session.execute(select(*TASK_OCCURRENCE_COLUMNS).where(Task.is_recurring.is_(True))).all()
+    if not tasks:
+        return 0
+    last_dates = dict(db.session.query(TaskOccurrence.task_id, func.max(TaskOccurrence.date)).filter(
+        TaskOccurrence.task_id.in_([t.id for t in tasks])
+    ).group_by(TaskOccurrence.task_id).all())
+    rows = []
+    for task in tasks:
+        last = last_dates.get(task.id)
+        start = last + timedelta(days=1) if last else date.min
+        if start <= until:
+            rows.extend(task_occurrence_rows(task, start, until))
+    insert_occurrence_rows(db.session.connection(), rows)
+    from day_activity import refresh_occurrence_keys
+    refresh_occurrence_keys(rows)
+    return len(rows)
+
+
+def rebuild_task_occurrences():
+    """Tabloyu baştan doldur (ilk kurulum / onarım). Yazılan satır sayısını döner."""
+    connection = db.session.connection()
+    connection.execute(delete(TaskOccurrence.__table__))
+    until = horizon_end()
+    rows = []
+    for task in db.session.execute(select(*TASK_OCCURRENCE_COLUMNS)).all():
+        rows.extend(task_occurrence_rows(task, date.min, until))
+    insert_occurrence_rows(connection, rows)
+    return len(rows)
+
+
+def ensure_occurrence_horizon(end):
+    """Ufkun ötesindeki bir aralık isteniyorsa tekrarları o güne kadar aç.
+    Eklenen satır sayısını döner; commit çağırana aittir.
+    """
+    if end > horizon_end():
+        return extend_task_occurrences(end)
+    return 0
+
+
+def occurrence_query(user_ids, start, end):
+    """(gün, görev) çiftleri; [start, end] kapalı aralık. Görev ile birleştirilir, silinmiş görevler düşer.
+    Ufkun ötesi isteniyorsa çağıran önce ensure_occurrence_horizon çağırmalıdır.
+    """
+    return db.session.query(TaskOccurrence.date, Task).join(Task, Task.id == TaskOccurrence.task_id).filter(
+        TaskOccurrence.user_id.in_(user_ids),
+        TaskOccurrence.date >= start,
+        TaskOccurrence.date <= end
+    )
+
+
+def occurrence_fields_changed(task) -> bool:
+    state = inspect(task)
+    return any(state.attrs[name].history.has_changes() for name in OCCURRENCE_FIELDS)
+
+
+@event.listens_for(Session, 'after_flush')
+def sync_task_occurrences_after_flush(session, flush_context):
+    """Görev eklendiğinde/değiştiğinde/silindiğinde tekrar satırlarını aynı işlemde güncelle"""
+    changed = [obj for obj in session.new if isinstance(obj, Task)]
+    changed.extend(obj for obj in session.dirty if isinstance(obj, Task) and occurrence_fields_changed(obj))
+    deleted_ids = [obj.id for obj in session.deleted if isinstance(obj, Task)]
+    if not changed and not deleted_ids:
+        return
+    connection = session.connection()
+    if deleted_ids:
+        connection.execute(delete(TaskOccurrence.__table__).where(TaskOccurrence.task_id.in_(deleted_ids)))
+    replace_task_occurrences(connection, changed)